@@ -1,7 +1,82 @@
+import json
+
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
 from .models import Book, Borrowing, Payment
 
-admin.site.register(Book)
-admin.site.register(Borrowing)
-admin.site.register(Payment)
+# Below this many estimated rows the exact count is cheap enough
+EXACT_COUNT_LIMIT = 100_000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that takes the planner's row estimate instead of running
+    COUNT(*) on big PostgreSQL tables, page numbers may be slightly off
+    """
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return super().count
+
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+        if estimate < EXACT_COUNT_LIMIT:
+            return super().count
+        return estimate
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Skip the extra COUNT(*) of the whole table next to filtered results
+    show_full_result_count = False
+
+
+@admin.register(Book)
+class BookAdmin(LargeTableAdmin):
+    list_display = ("id", "title", "author", "cover", "inventory", "daily_fee")
+    search_fields = ("title", "author")
+
+
+@admin.register(Borrowing)
+class BorrowingAdmin(LargeTableAdmin):
+    list_display = (
+        "id",
+        "book",
+        "user",
+        "borrow_date",
+        "expected_return_date",
+        "actual_return_date",
+    )
+    list_select_related = ("book", "user")
+    raw_id_fields = ("book", "user")
+    list_filter = (
+        ("actual_return_date", admin.EmptyFieldListFilter),
+        "borrow_date",
+    )
+
+
+@admin.register(Payment)
+class PaymentAdmin(LargeTableAdmin):
+    list_display = (
+        "id",
+        "borrowing",
+        "status",
+        "type",
+        "money_to_pay",
+        "session_expires_at",
+    )
+    list_select_related = ("borrowing__book", "borrowing__user")
+    raw_id_fields = ("borrowing",)
+    list_filter = ("status", "type")
+    search_fields = ("=session_id",)
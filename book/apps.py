@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class BookConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "book"
+
+    def ready(self) -> None:
+        from . import signals  # noqa: F401
+        from .http_clients import configure_stripe
+
+        configure_stripe()
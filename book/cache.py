@@ -0,0 +1,127 @@
+import hashlib
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+from django.core.cache import caches
+from django.db import transaction
+from django.http import QueryDict
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+CATALOG_CACHE = "catalog"
+VERSION_KEY = "catalog:version"
+HITS_KEY = "catalog:hits"
+MISSES_KEY = "catalog:misses"
+
+
+class PreRenderedJSONResponse(Response):
+    """
+    Response with a JSON body that was rendered ahead of time
+    """
+
+    def __init__(self, content: bytes, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.prerendered_content = content
+
+    @property
+    def rendered_content(self) -> bytes:
+        self["Content-Type"] = "application/json"
+        return self.prerendered_content
+
+
+def _cache():
+    return caches[CATALOG_CACHE]
+
+
+def get_catalog_version() -> int:
+    cache = _cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from a timestamp so an evicted version key never brings
+        # back payloads cached under an older version
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate_catalog() -> None:
+    """
+    Make every cached book list page and book payload unreachable
+    """
+    try:
+        _cache().incr(VERSION_KEY)
+    except ValueError:
+        get_catalog_version()
+    except Exception:
+        logger.warning("Failed to invalidate the catalog cache", exc_info=True)
+
+
+def invalidate_catalog_on_commit() -> None:
+    # Invalidate right away and once more after commit, so a reader can't
+    # cache the pre-commit state in between
+    invalidate_catalog()
+    transaction.on_commit(invalidate_catalog)
+
+
+def catalog_key(
+    name: str, query_params: Optional[QueryDict] = None, origin: str = ""
+) -> str:
+    """
+    Key of a catalog payload. Paginated payloads hold absolute links,
+    so the origin they were built for is part of the key.
+    """
+    params = sorted((query_params or QueryDict()).lists())
+    digest = hashlib.md5(f"{origin}:{params!r}".encode()).hexdigest()
+    return f"catalog:{get_catalog_version()}:{name}:{digest}"
+
+
+def _count(key: str) -> None:
+    cache = _cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def cached_catalog_response(
+    name: str, request: Request, build: Callable[[], Response]
+) -> Response:
+    """
+    Serve a catalog GET from the cache, building and rendering it on a miss
+    """
+    if request.accepted_renderer.format != "json":
+        return build()
+
+    try:
+        key = catalog_key(
+            name, request.query_params, f"{request.scheme}://{request.get_host()}"
+        )
+        payload = _cache().get(key)
+        _count(MISSES_KEY if payload is None else HITS_KEY)
+    except Exception:
+        # The catalog stays available from the database if Redis is down
+        logger.warning("Catalog cache is unavailable", exc_info=True)
+        return build()
+
+    if payload is not None:
+        return PreRenderedJSONResponse(payload)
+
+    response = build()
+    payload = JSONRenderer().render(response.data)
+    try:
+        _cache().set(key, payload)
+    except Exception:
+        logger.warning("Failed to store catalog payload", exc_info=True)
+    return PreRenderedJSONResponse(payload, data=response.data)
+
+
+def catalog_cache_stats() -> Dict[str, int]:
+    stats = _cache().get_many([HITS_KEY, MISSES_KEY])
+    return {
+        "hits": stats.get(HITS_KEY, 0),
+        "misses": stats.get(MISSES_KEY, 0),
+    }
@@ -0,0 +1,41 @@
+import random
+from datetime import date
+
+from django.conf import settings
+from django.db.models import F, Sum
+
+from book.models import Counter
+
+BOOKS_COUNTER = "books"
+
+
+def borrowings_counter(year: int) -> str:
+    return f"borrowings:{year}"
+
+
+def increment_counter(name: str, delta: int = 1) -> None:
+    """
+    Add delta to a random shard of the counter, in the current transaction
+    """
+    if not delta:
+        return
+    shard = random.randrange(settings.COUNTER_SHARDS)
+    counter = Counter.objects.filter(name=name, shard=shard)
+    if not counter.update(value=F("value") + delta):
+        # First write to the counter, another writer may create it concurrently
+        Counter.objects.bulk_create(
+            [
+                Counter(name=name, shard=shard)
+                for shard in range(settings.COUNTER_SHARDS)
+            ],
+            ignore_conflicts=True,
+        )
+        counter.update(value=F("value") + delta)
+
+
+def get_counter(name: str) -> int:
+    return Counter.objects.filter(name=name).aggregate(total=Sum("value"))["total"] or 0
+
+
+def count_borrowings(borrow_date: date, delta: int = 1) -> None:
+    increment_counter(borrowings_counter(borrow_date.year), delta)
@@ -0,0 +1,52 @@
+import csv
+import json
+from typing import Dict, Iterable, Iterator, List
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+
+EXPORT_CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class _Echo:
+    """
+    File-like object for csv.writer that hands back written lines
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def csv_lines(rows: Iterable[Dict], fields: List[str]) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([row[field] for field in fields])
+
+
+def ndjson_lines(rows: Iterable[Dict]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+def export_response(
+    queryset: QuerySet, fields: List[str], output: str, filename: str
+) -> StreamingHttpResponse:
+    """
+    Stream the queryset's fields as CSV or NDJSON, rows are read from the
+    database in chunks while the response is being sent
+    """
+    rows = queryset.values(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    if output == "csv":
+        lines = csv_lines(rows, fields)
+    else:
+        lines = ndjson_lines(rows)
+    response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[output])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{output}"'
+    return response
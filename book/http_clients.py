@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import random
+import ssl
+import threading
+import time
+from functools import lru_cache
+from typing import Optional
+
+import httpx
+import requests
+import stripe
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(requests.RequestException):
+    """
+    Raised instead of calling an upstream that keeps failing
+    """
+
+
+class CircuitBreaker:
+    """
+    Stops calls to an upstream after `failure_threshold` failures in a row.
+    After `reset_timeout` seconds one trial call is let through, and
+    its outcome closes the circuit or opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            waiting = time.monotonic() - self._opened_at < self.reset_timeout
+            if waiting or self._trial_running:
+                raise CircuitOpenError(f"{self.name} is unavailable, circuit is open")
+            self._trial_running = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning("Opening the circuit of %s", self.name)
+                self._opened_at = time.monotonic()
+
+
+def retry_delay(attempt: int) -> float:
+    """
+    Exponential backoff with full jitter, so clients retrying
+    at the same time spread out
+    """
+    return random.uniform(0, settings.HTTP_RETRY_BACKOFF * 2**attempt)
+
+
+class ResilientSession(requests.Session):
+    """
+    Keep-alive session guarded by a circuit breaker. Requests get a default
+    timeout, and connection failures, which never reached the upstream,
+    are retried with jittered backoff. 5xx responses count as failures
+    of the upstream but are returned as they are.
+    """
+
+    def __init__(self, breaker: CircuitBreaker, timeout: float, retries: int):
+        super().__init__()
+        self.breaker = breaker
+        self.timeout = timeout
+        self.retries = retries
+        adapter = HTTPAdapter(pool_maxsize=settings.HTTP_POOL_SIZE)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def request(self, method, url, *args, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(self.retries + 1):
+            self.breaker.before_call()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except requests.ConnectionError:
+                self.breaker.record_failure()
+                if attempt == self.retries:
+                    raise
+            except requests.RequestException:
+                self.breaker.record_failure()
+                raise
+            else:
+                if response.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                return response
+            time.sleep(retry_delay(attempt))
+
+
+stripe_breaker = CircuitBreaker(
+    "Stripe",
+    settings.CIRCUIT_BREAKER_FAILURES,
+    settings.CIRCUIT_BREAKER_RESET_TIMEOUT,
+)
+telegram_breaker = CircuitBreaker(
+    "Telegram",
+    settings.CIRCUIT_BREAKER_FAILURES,
+    settings.CIRCUIT_BREAKER_RESET_TIMEOUT,
+)
+
+telegram_session = ResilientSession(
+    telegram_breaker, settings.TELEGRAM_REQUEST_TIMEOUT, settings.HTTP_RETRIES
+)
+
+
+@lru_cache(maxsize=None)
+def _ssl_context() -> ssl.SSLContext:
+    # Loading the CA bundle takes tens of milliseconds, do it once
+    return httpx.create_ssl_context()
+
+
+_stripe_async_client: Optional[httpx.AsyncClient] = None
+_stripe_async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def stripe_async_client() -> httpx.AsyncClient:
+    """
+    Keep-alive client shared by the Stripe calls of async views. Its
+    connections belong to the event loop that opened them, so calls from
+    another loop, like the one async_to_sync starts for each WSGI
+    request, get a new client. Under uvicorn a worker keeps its loop,
+    and its client.
+    """
+    global _stripe_async_client, _stripe_async_client_loop
+    loop = asyncio.get_running_loop()
+    if _stripe_async_client is None or _stripe_async_client_loop is not loop:
+        _stripe_async_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_POOL_SIZE,
+                max_keepalive_connections=settings.HTTP_POOL_SIZE,
+            ),
+            verify=_ssl_context(),
+        )
+        _stripe_async_client_loop = loop
+    return _stripe_async_client
+
+
+def configure_stripe() -> None:
+    """
+    Point the stripe library at the settings and the pooled session.
+    The library retries on its own, adding idempotency keys to POSTs.
+    """
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    stripe.max_network_retries = settings.HTTP_RETRIES
+    stripe.default_http_client = stripe.http_client.RequestsClient(
+        timeout=settings.STRIPE_REQUEST_TIMEOUT,
+        session=ResilientSession(
+            stripe_breaker, settings.STRIPE_REQUEST_TIMEOUT, retries=0
+        ),
+    )
+
+
+@receiver(setting_changed)
+def reconfigure_stripe(setting: str, **kwargs) -> None:
+    if setting.startswith("STRIPE_") or setting == "HTTP_RETRIES":
+        configure_stripe()
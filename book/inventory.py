@@ -0,0 +1,75 @@
+from collections import Counter
+from functools import reduce
+from operator import or_
+from typing import List
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, Value, When
+
+from .cache import invalidate_catalog_on_commit
+from .models import Book
+
+
+def reserve_book(book_id: int) -> bool:
+    """
+    Take one copy of the book out of the inventory.
+
+    A single conditional UPDATE is used, so concurrent borrowings neither
+    lose updates nor push the inventory below zero.
+    Returns False when no copy is left.
+    """
+    reserved = Book.objects.filter(pk=book_id, inventory__gt=0).update(
+        inventory=F("inventory") - 1
+    )
+    if reserved:
+        invalidate_catalog_on_commit()
+    return bool(reserved)
+
+
+def release_book(book_id: int) -> None:
+    """
+    Put one copy of the book back into the inventory
+    """
+    Book.objects.filter(pk=book_id).update(inventory=F("inventory") + 1)
+    invalidate_catalog_on_commit()
+
+
+def _per_book_change(counts: Counter) -> Case:
+    return Case(
+        *[When(pk=book_id, then=Value(count)) for book_id, count in counts.items()],
+        output_field=PositiveIntegerField(),
+    )
+
+
+def reserve_books(book_ids: List[int]) -> bool:
+    """
+    Take a copy of every listed book (repeats allowed) with a single UPDATE.
+
+    Either all copies are reserved or none: when any book is out of stock
+    the update is rolled back and False is returned.
+    """
+    counts = Counter(book_ids)
+    in_stock = reduce(
+        or_,
+        (Q(pk=book_id, inventory__gte=count) for book_id, count in counts.items()),
+    )
+    with transaction.atomic():
+        reserved = Book.objects.filter(in_stock).update(
+            inventory=F("inventory") - _per_book_change(counts)
+        )
+        if reserved != len(counts):
+            transaction.set_rollback(True)
+            return False
+    invalidate_catalog_on_commit()
+    return True
+
+
+def release_books(book_ids: List[int]) -> None:
+    """
+    Put a copy of every listed book back with a single UPDATE
+    """
+    counts = Counter(book_ids)
+    Book.objects.filter(pk__in=counts).update(
+        inventory=F("inventory") + _per_book_change(counts)
+    )
+    invalidate_catalog_on_commit()
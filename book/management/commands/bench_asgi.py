@@ -0,0 +1,124 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import List
+
+import httpx
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.urls import reverse
+
+from book.models import Book, Borrowing, Payment
+from customer.models import User
+from library_service_api.handlers import StreamingASGIHandler
+from tests.fakes import FakeStripeServer
+
+BASE_URL = "http://localhost"
+
+
+class Command(BaseCommand):
+    """Django command to load test a Stripe-calling endpoint over WSGI and ASGI"""
+
+    help = "Benchmark concurrent payment initiations served by WSGI and ASGI"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=8,
+            help="Request threads of the WSGI worker",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=100,
+            help="Requests in flight against the ASGI application",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.2,
+            help="Seconds the stub Stripe server waits before answering",
+        )
+
+    def handle(self, *args, **options):
+        # The applications query from their own threads, so the seeded
+        # rows are committed and deleted afterwards
+        user = User.objects.create_user(email="bench_asgi@example.com")
+        try:
+            urls = self.seed(user, options["requests"])
+            with FakeStripeServer(
+                latency=options["latency"]
+            ) as server, server.serving_stripe():
+                self.report("WSGI", self.run_wsgi(urls, options))
+                self.report("ASGI", asyncio.run(self.run_asgi(urls, options)))
+        finally:
+            Book.objects.filter(borrowing__user=user).delete()
+            user.delete()
+
+    def report(self, name: str, result) -> None:
+        elapsed, timings = result
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        self.stdout.write(
+            f"{name}: {len(timings) / elapsed:,.1f} requests/s, "
+            f"p95 {p95 * 1000:,.0f} ms"
+        )
+
+    @staticmethod
+    def run_wsgi(urls: List[str], options):
+        client = httpx.Client(
+            transport=httpx.WSGITransport(app=get_wsgi_application()),
+            base_url=BASE_URL,
+        )
+
+        def request(url: str) -> float:
+            started = time.perf_counter()
+            client.get(url).raise_for_status()
+            return time.perf_counter() - started
+
+        with client, ThreadPoolExecutor(max_workers=options["threads"]) as executor:
+            started = time.perf_counter()
+            timings = list(executor.map(request, urls))
+            return time.perf_counter() - started, timings
+
+    @staticmethod
+    async def run_asgi(urls: List[str], options):
+        in_flight = asyncio.Semaphore(options["concurrency"])
+
+        async def request(url: str) -> float:
+            async with in_flight:
+                started = time.perf_counter()
+                response = await client.get(url)
+                response.raise_for_status()
+                return time.perf_counter() - started
+
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=StreamingASGIHandler()),
+            base_url=BASE_URL,
+        ) as client:
+            started = time.perf_counter()
+            timings = await asyncio.gather(*(request(url) for url in urls))
+            return time.perf_counter() - started, timings
+
+    @staticmethod
+    def seed(user: User, requests: int) -> List[str]:
+        book = Book.objects.create(
+            title="Benchmark Book", author="Benchmark", cover="Soft", daily_fee=1
+        )
+        today = date.today()
+        borrowing = Borrowing.objects.create(
+            book=book,
+            user=user,
+            borrow_date=today,
+            expected_return_date=today + timedelta(days=7),
+        )
+        payments = Payment.objects.bulk_create(
+            [Payment(borrowing=borrowing, money_to_pay=7) for _ in range(requests)]
+        )
+        return [
+            reverse("book:initiate_payment", kwargs={"payment_id": payment.id})
+            for payment in payments
+        ]
@@ -0,0 +1,126 @@
+import time
+from datetime import date, timedelta
+from typing import Dict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import QuerySet
+
+from book.models import Book, Borrowing, Payment
+from customer.models import User
+
+# Indexes added for the borrowing and payment filters
+INDEXES = [
+    "borrowing_user_active_idx",
+    "borrowing_borrow_date_idx",
+    "payment_pending_borrowing_idx",
+    "payment_session_id_idx",
+]
+
+
+class Command(BaseCommand):
+    """Django command to compare query plans with and without the indexes"""
+
+    help = "Seed borrowings and print EXPLAIN plans of the hot filters"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--borrowings", type=int, default=1_000_000)
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Query plans are compared on PostgreSQL only")
+
+        # Seeded rows and dropped indexes are rolled back
+        with transaction.atomic():
+            started = time.perf_counter()
+            self.seed(options)
+            self.stdout.write(
+                f"Seeded {options['borrowings']} borrowings "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+            self.analyze()
+
+            self.explain_all("With indexes")
+            with connection.cursor() as cursor:
+                for name in INDEXES:
+                    cursor.execute(f"DROP INDEX {connection.ops.quote_name(name)}")
+            self.analyze()
+            self.explain_all("Without indexes")
+
+            transaction.set_rollback(True)
+
+    def seed(self, options) -> None:
+        users = User.objects.bulk_create(
+            [
+                User(email=f"bench_indexes_{i}@example.com", password="!")
+                for i in range(options["users"])
+            ],
+            batch_size=options["batch_size"],
+        )
+        book = Book.objects.create(
+            title="Benchmark Book", author="Benchmark", cover="Soft", daily_fee=1
+        )
+        start = date.today() - timedelta(days=5 * 365)
+        batch_size = options["batch_size"]
+
+        for offset in range(0, options["borrowings"], batch_size):
+            count = min(batch_size, options["borrowings"] - offset)
+            borrowings = Borrowing.objects.bulk_create(
+                [
+                    Borrowing(
+                        book=book,
+                        user=users[i % len(users)],
+                        borrow_date=start + timedelta(days=i % (5 * 365)),
+                        expected_return_date=start + timedelta(days=i % (5 * 365) + 14),
+                        # One borrowing in fifty is still out
+                        actual_return_date=None
+                        if i % 50 == 0
+                        else start + timedelta(days=i % (5 * 365) + 10),
+                    )
+                    for i in range(offset, offset + count)
+                ]
+            )
+            # Every tenth borrowing has a payment, a few of them pending
+            Payment.objects.bulk_create(
+                [
+                    Payment(
+                        borrowing=borrowing,
+                        status=Payment.PENDING if i % 100 == 0 else Payment.PAID,
+                        session_id=f"cs_bench_{offset + i}",
+                        session_url="",
+                        money_to_pay=1,
+                    )
+                    for i, borrowing in enumerate(borrowings)
+                    if i % 10 == 0
+                ]
+            )
+
+    @staticmethod
+    def analyze() -> None:
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE book_borrowing, book_payment")
+
+    def queries(self) -> Dict[str, QuerySet]:
+        user = User.objects.filter(email="bench_indexes_1@example.com").get()
+        return {
+            "Active borrowings of a user": Borrowing.objects.filter(
+                user=user, actual_return_date__isnull=True
+            ),
+            "Borrowings this year": Borrowing.objects.filter(
+                borrow_date__year=date.today().year
+            ).values("id"),
+            "Pending payments of a user": Payment.objects.filter(
+                borrowing__user=user, status=Payment.PENDING
+            ),
+            "Payments of a Stripe session": Payment.objects.filter(
+                session_id="cs_bench_1000"
+            ),
+        }
+
+    def explain_all(self, title: str) -> None:
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for name, queryset in self.queries().items():
+            self.stdout.write(self.style.SUCCESS(name))
+            self.stdout.write(queryset.explain(analyze=True))
@@ -0,0 +1,54 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+
+class Command(BaseCommand):
+    """Django command to compare password checks of the configured hashers"""
+
+    help = "Benchmark logins per second and per core of the password hashers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=200)
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=8,
+            help="Concurrent logins, like request threads of a web worker",
+        )
+
+    def handle(self, *args, **options):
+        cores = os.cpu_count() or 1
+        workers = settings.PASSWORD_HASHING_WORKERS or options["threads"]
+        for name, hasher, pool_workers in [
+            ("PBKDF2", "pbkdf2_sha256", 0),
+            ("scrypt", "scrypt", 0),
+            ("scrypt, hashing pool", "scrypt", workers),
+        ]:
+            with override_settings(PASSWORD_HASHING_WORKERS=pool_workers):
+                encoded = make_password("benchmark password", hasher=hasher)
+                rate = self.rate(encoded, options)
+            used_cores = min(pool_workers or options["threads"], cores)
+            self.stdout.write(
+                f"{name}: {rate:,.1f} logins/s, "
+                f"{rate / used_cores:,.1f} logins/s per core ({used_cores} cores)"
+            )
+
+    @staticmethod
+    def rate(encoded: str, options) -> float:
+        with ThreadPoolExecutor(max_workers=options["threads"]) as executor:
+            started = time.perf_counter()
+            checks = list(
+                executor.map(
+                    lambda _: check_password("benchmark password", encoded),
+                    range(options["logins"]),
+                )
+            )
+            elapsed = time.perf_counter() - started
+        assert all(checks)
+        return len(checks) / elapsed
@@ -0,0 +1,100 @@
+import time
+from datetime import date, timedelta
+from typing import Callable
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from book.models import Book, Borrowing, Payment
+from book.serializers import BookSerializer, BorrowingSerializer, PaymentSerializer
+from book.values_serializers import values_serializer
+from customer.models import User
+
+
+class Command(BaseCommand):
+    """Django command to compare list serialization with DRF and from values()"""
+
+    help = "Benchmark rows per second of the list serializers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        # Seeded rows are rolled back
+        with transaction.atomic():
+            self.seed(options["rows"])
+            request = RequestFactory().get("/")
+            request.user = User(is_superuser=True)
+            for serializer_class, queryset in [
+                (BookSerializer, Book.objects.all()),
+                (BorrowingSerializer, Borrowing.objects.select_related("book")),
+                (PaymentSerializer, Payment.objects.all()),
+            ]:
+                queryset = queryset.order_by("-id")[: options["rows"]]
+                fast = values_serializer(serializer_class)
+                drf_rate = self.rate(
+                    lambda: serializer_class(
+                        queryset.all(), many=True, context={"request": request}
+                    ).data,
+                    options,
+                )
+                fast_rate = self.rate(
+                    lambda: fast.to_representation(queryset.values(*fast.lookups)),
+                    options,
+                )
+                self.stdout.write(
+                    f"{serializer_class.__name__}: "
+                    f"DRF {drf_rate:,.0f} rows/s, "
+                    f"values() {fast_rate:,.0f} rows/s "
+                    f"({fast_rate / drf_rate:.1f}x)"
+                )
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def rate(serialize: Callable[[], list], options) -> float:
+        best = float("inf")
+        for _ in range(options["repeat"]):
+            started = time.perf_counter()
+            rows = len(serialize())
+            best = min(best, time.perf_counter() - started)
+        return rows / best
+
+    @staticmethod
+    def seed(rows: int) -> None:
+        user = User.objects.create_user(
+            email="bench_serializers@example.com", password="password"
+        )
+        books = Book.objects.bulk_create(
+            [
+                Book(
+                    title=f"Benchmark Book {i}",
+                    author="Benchmark",
+                    cover="Soft",
+                    daily_fee="1.25",
+                )
+                for i in range(rows)
+            ],
+            batch_size=1000,
+        )
+        today = date.today()
+        borrowings = Borrowing.objects.bulk_create(
+            [
+                Borrowing(
+                    book=book,
+                    user=user,
+                    borrow_date=today,
+                    expected_return_date=today + timedelta(days=7),
+                )
+                for book in books
+            ],
+            batch_size=1000,
+        )
+        Payment.objects.bulk_create(
+            [
+                Payment(borrowing=borrowing, money_to_pay="8.75")
+                for borrowing in borrowings
+            ],
+            batch_size=1000,
+        )
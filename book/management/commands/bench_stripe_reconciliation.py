@@ -0,0 +1,113 @@
+import time
+from datetime import timedelta
+
+import stripe
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from book.models import Book, Borrowing, Payment
+from book.strype_service import session_payment_status
+from book.tasks import check_expired_sessions
+from customer.models import User
+from tests.fakes import FakeStripeServer
+
+
+class Command(BaseCommand):
+    """Django command to time check_expired_sessions against a local Stripe stub"""
+
+    help = "Benchmark reconciliation of pending payments with Stripe sessions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--payments", type=int, default=10000)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.02,
+            help="Seconds the stub Stripe server waits before answering",
+        )
+        parser.add_argument(
+            "--serial",
+            action="store_true",
+            help="Also time the old one-request-per-payment loop",
+        )
+        parser.add_argument(
+            "--deadlines",
+            action="store_true",
+            help="Store session deadlines spread over the last and next 30 minutes",
+        )
+
+    def handle(self, *args, **options):
+        with FakeStripeServer(
+            latency=options["latency"]
+        ) as server, server.serving_stripe():
+            if options["serial"]:
+                self.run("serial", self.reconcile_serially, server, options)
+            self.run("concurrent", check_expired_sessions, server, options)
+
+    def run(self, name: str, reconcile, server: FakeStripeServer, options) -> None:
+        # Seeded rows are rolled back after every run
+        with transaction.atomic():
+            self.seed(options["payments"], server, options["deadlines"])
+            server.requests.clear()
+            started = time.perf_counter()
+            reconcile()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{name}: {options['payments']} payments, "
+                f"{len(server.requests)} Stripe requests in {elapsed:.2f}s"
+            )
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def seed(count: int, server: FakeStripeServer, deadlines: bool) -> None:
+        user = User.objects.create_user(
+            email="bench_reconciliation@example.com", password="password"
+        )
+        book = Book.objects.create(
+            title="Benchmark Book", author="Benchmark", cover="Soft", daily_fee=1
+        )
+        now = timezone.now()
+        today = now.date()
+        borrowing = Borrowing.objects.create(
+            book=book,
+            user=user,
+            borrow_date=today,
+            expected_return_date=today + timedelta(days=7),
+        )
+        Payment.objects.bulk_create(
+            [
+                Payment(
+                    borrowing=borrowing,
+                    money_to_pay=1,
+                    session_id=f"cs_bench_{i}",
+                    session_url="",
+                    session_expires_at=(
+                        now + timedelta(minutes=30 - i % 60) if deadlines else None
+                    ),
+                )
+                for i in range(count)
+            ],
+            batch_size=1000,
+        )
+        # A third of the sessions expired, a third were paid, the rest are open
+        server.sessions = {
+            f"cs_bench_{i}": {"status": "expired"} for i in range(0, count, 3)
+        }
+        server.sessions.update(
+            {
+                f"cs_bench_{i}": {"status": "complete", "payment_status": "paid"}
+                for i in range(1, count, 3)
+            }
+        )
+
+    @staticmethod
+    def reconcile_serially() -> None:
+        stripe.api_key = settings.STRIPE_SECRET_KEY
+        for payment in Payment.objects.filter(status=Payment.PENDING):
+            session = stripe.checkout.Session.retrieve(payment.session_id)
+            new_status = session_payment_status(session)
+            if new_status:
+                payment.status = new_status
+                payment.save()
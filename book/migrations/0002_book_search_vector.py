@@ -0,0 +1,62 @@
+# Generated by Django 4.1.7 on 2026-10-17 06:35
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+SEARCH_SQL = """
+CREATE OR REPLACE FUNCTION book_book_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.author, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER book_book_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, author, search_vector ON book_book
+    FOR EACH ROW EXECUTE FUNCTION book_book_search_vector_update();
+
+UPDATE book_book SET search_vector = NULL;
+
+CREATE INDEX book_book_search_vector_idx
+    ON book_book USING gin (search_vector);
+CREATE INDEX book_book_title_trgm_idx
+    ON book_book USING gin (UPPER(title) gin_trgm_ops);
+"""
+
+REVERSE_SEARCH_SQL = """
+DROP INDEX IF EXISTS book_book_title_trgm_idx;
+DROP INDEX IF EXISTS book_book_search_vector_idx;
+DROP TRIGGER IF EXISTS book_book_search_vector_trigger ON book_book;
+DROP FUNCTION IF EXISTS book_book_search_vector_update();
+"""
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(SEARCH_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(REVERSE_SEARCH_SQL)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book", "0001_initial"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="book",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.1.7 on 2026-10-17 06:58
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import ExtractYear
+
+
+def backfill_counters(apps, schema_editor):
+    Book = apps.get_model("book", "Book")
+    Borrowing = apps.get_model("book", "Borrowing")
+    Counter = apps.get_model("book", "Counter")
+    counters = [Counter(name="books", shard=0, value=Book.objects.count())]
+    yearly_borrowings = (
+        Borrowing.objects.annotate(year=ExtractYear("borrow_date"))
+        .values("year")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    counters += [
+        Counter(name=f"borrowings:{row['year']}", shard=0, value=row["count"])
+        for row in yearly_borrowings
+    ]
+    Counter.objects.bulk_create(counters)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book", "0007_borrowing_payment_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Counter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                ("shard", models.PositiveSmallIntegerField()),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="counter",
+            constraint=models.UniqueConstraint(
+                fields=("name", "shard"), name="counter_name_shard_unique"
+            ),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.1.7 on 2026-10-17 08:26
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book", "0008_counter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="created_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                condition=models.Q(("session_id", ""), ("status", "PENDING")),
+                fields=["created_at"],
+                name="payment_missing_session_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-17 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book", "0009_payment_created_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="batch_id",
+            field=models.UUIDField(blank=True, null=True),
+        ),
+    ]
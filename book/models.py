@@ -1,4 +1,8 @@
+from datetime import date
+
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
 from enum import Enum
 from customer.models import User
 
@@ -18,11 +22,21 @@ class Book(models.Model):
     author = models.CharField(max_length=255)
     inventory = models.PositiveIntegerField(default=0)
     daily_fee = models.DecimalField(max_digits=10, decimal_places=2)
+    # Maintained by a database trigger on PostgreSQL, see book/search.py
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return self.title
 
 
+class BorrowingQuerySet(models.QuerySet):
+    def overdue(self, today: date = None) -> "BorrowingQuerySet":
+        today = today or timezone.now().date()
+        return self.filter(
+            expected_return_date__lt=today, actual_return_date__isnull=True
+        )
+
+
 class Borrowing(models.Model):
     borrow_date = models.DateField()
     expected_return_date = models.DateField()
@@ -30,6 +44,25 @@ class Borrowing(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE, null=False, blank=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
+    objects = BorrowingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["expected_return_date"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowing_overdue_idx",
+            ),
+            # Borrowings a user hasn't returned yet
+            models.Index(
+                fields=["user"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowing_user_active_idx",
+            ),
+            # Yearly borrowing limit
+            models.Index(fields=["borrow_date"], name="borrowing_borrow_date_idx"),
+        ]
+
     def __str__(self):
         return f" borrowing {self.user}, borrowing id {self.id}"
 
@@ -57,6 +90,122 @@ class Payment(models.Model):
     session_url = models.URLField(max_length=400)
     session_id = models.CharField(max_length=400)
     money_to_pay = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    session_created_at = models.DateTimeField(null=True, blank=True)
+    session_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Shared by the payments of a bulk return, paid with one session
+    batch_id = models.UUIDField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["session_expires_at"],
+                condition=models.Q(status="PENDING"),
+                name="payment_pending_expiry_idx",
+            ),
+            # Pending payments that block a user from borrowing
+            models.Index(
+                fields=["borrowing"],
+                condition=models.Q(status="PENDING"),
+                name="payment_pending_borrowing_idx",
+            ),
+            # Not unique, payments of a bulk return share one session
+            models.Index(fields=["session_id"], name="payment_session_id_idx"),
+            # Payments whose session creation task was lost
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(status="PENDING", session_id=""),
+                name="payment_missing_session_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Payment {self.id} ({self.borrowing.book.title})"
+
+
+class TelegramMessage(models.Model):
+    """
+    Outbox of Telegram notifications, delivered by a Celery task
+    """
+
+    PENDING = "PENDING"
+    SENT = "SENT"
+    FAILED = "FAILED"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    ]
+    text = models.TextField()
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(status="PENDING"),
+                name="telegram_message_pending_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"Telegram message {self.id} ({self.status})"
+
+
+class StripeEvent(models.Model):
+    """
+    Inbox of Stripe webhook events, applied to payments by a Celery task
+    """
+
+    PENDING = "PENDING"
+    PROCESSED = "PROCESSED"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (PROCESSED, "Processed"),
+    ]
+    # Stripe may deliver the same event more than once
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(max_length=9, choices=STATUS_CHOICES, default=PENDING)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(status="PENDING"),
+                name="stripe_event_pending_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"Stripe event {self.event_id} ({self.type})"
+
+
+class Counter(models.Model):
+    """
+    Row count maintained alongside the counted rows. Each counter is
+    split over several shard rows so concurrent writers rarely wait
+    for the same row lock, its value is the sum of the shards.
+    """
+
+    name = models.CharField(max_length=100)
+    shard = models.PositiveSmallIntegerField()
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "shard"], name="counter_name_shard_unique"
+            )
+        ]
+
+    def __str__(self):
+        return f"Counter {self.name} ({self.shard}): {self.value}"
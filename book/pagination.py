@@ -1,7 +1,19 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
-class CharactersListPagination(PageNumberPagination):
+class BookListPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = "page_size"
     max_page_size = 100
+
+
+class NewestFirstCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the primary key, a page costs the same
+    however deep it is
+    """
+
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    ordering = "-id"
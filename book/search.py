@@ -0,0 +1,48 @@
+from functools import reduce
+from operator import and_
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, QuerySet, Value, When
+
+from .models import Book
+
+# Must match the configuration used by the search_vector trigger
+# in book/migrations/0002_book_search_vector.py
+SEARCH_CONFIG = "english"
+
+
+def search_books(queryset: QuerySet[Book], query: str) -> QuerySet[Book]:
+    """
+    Full-text search across title and author ordered by relevance
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+
+    if connection.vendor == "postgresql":
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type="websearch")
+        return (
+            queryset.filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F("search_vector"), search_query))
+            .order_by("-rank", "id")
+        )
+
+    # Fallback for databases without tsvector support (e.g. SQLite test runs):
+    # every term has to match either title or author, title matches rank first
+    terms = query.split()
+    matches = reduce(
+        and_, (Q(title__icontains=term) | Q(author__icontains=term) for term in terms)
+    )
+    return (
+        queryset.filter(matches)
+        .annotate(
+            rank=Case(
+                When(title__icontains=query, then=Value(2)),
+                When(author__icontains=query, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        )
+        .order_by("-rank", "id")
+    )
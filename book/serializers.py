@@ -2,9 +2,24 @@ from datetime import date
 from typing import List, Dict
 from rest_framework import serializers
 
+from customer.authentication import get_full_user
+from customer.models import User
+
+from .counters import BOOKS_COUNTER, borrowings_counter, get_counter
 from .models import Book, Borrowing, Payment
 from .telegram_bot import notify_successful_payment
 
+MAX_BORROWINGS_PER_YEAR = 50000
+MAX_BULK_ITEMS = 50
+
+
+def validate_borrowing_limit(new_borrowings: int = 1) -> None:
+    borrowing_count: int = get_counter(borrowings_counter(date.today().year))
+    if borrowing_count + new_borrowings > MAX_BORROWINGS_PER_YEAR:
+        raise serializers.ValidationError(
+            "Maximum number of borrowings reached for this year."
+        )
+
 
 class BookSerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,15 +34,24 @@ class BookSerializer(serializers.ModelSerializer):
         )
 
     def validate(self, data: Dict) -> Dict:
-        if Book.objects.count() >= 1000:
+        if get_counter(BOOKS_COUNTER) >= 1000:
             raise serializers.ValidationError("Maximum number of books reached.")
         return data
 
 
+class CurrentFullUserDefault(serializers.CurrentUserDefault):
+    """
+    Request user as a User instance, token users are only built from claims
+    """
+
+    def __call__(self, serializer_field) -> User:
+        return get_full_user(super().__call__(serializer_field))
+
+
 class BorrowingSerializer(serializers.ModelSerializer):
     book: int = serializers.PrimaryKeyRelatedField(queryset=Book.objects.all())
     user_id: int = serializers.IntegerField(source="user.id", read_only=True)
-    user: int = serializers.HiddenField(default=serializers.CurrentUserDefault())
+    user: int = serializers.HiddenField(default=CurrentFullUserDefault())
 
     class Meta:
         model = Borrowing
@@ -52,16 +76,44 @@ class BorrowingSerializer(serializers.ModelSerializer):
         return data
 
     def validate(self, data: Dict) -> Dict:
-        borrowing_count: int = Borrowing.objects.filter(
-            borrow_date__year=date.today().year
-        ).count()
-        if borrowing_count >= 50000:
-            raise serializers.ValidationError(
-                "Maximum number of borrowings reached for this year."
-            )
+        validate_borrowing_limit()
+        return data
+
+
+class BulkBorrowingSerializer(serializers.Serializer):
+    books: List[int] = serializers.ListField(
+        child=serializers.IntegerField(),
+        min_length=1,
+        max_length=MAX_BULK_ITEMS,
+    )
+    borrow_date: date = serializers.DateField()
+    expected_return_date: date = serializers.DateField()
+
+    def validate_books(self, value: List[int]) -> List[Book]:
+        books: Dict[int, Book] = Book.objects.in_bulk(value)
+        missing = sorted(set(value) - set(books))
+        if missing:
+            raise serializers.ValidationError(f"Books {missing} do not exist.")
+        return [books[book_id] for book_id in value]
+
+    def validate(self, data: Dict) -> Dict:
+        validate_borrowing_limit(len(data["books"]))
         return data
 
 
+class BulkBorrowingReturnSerializer(serializers.Serializer):
+    borrowings: List[int] = serializers.ListField(
+        child=serializers.IntegerField(),
+        min_length=1,
+        max_length=MAX_BULK_ITEMS,
+    )
+
+    def validate_borrowings(self, value: List[int]) -> List[int]:
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError("Borrowings must not repeat.")
+        return value
+
+
 class BorrowingReturnSerializer(serializers.ModelSerializer):
     class Meta:
         model = Borrowing
@@ -97,3 +149,30 @@ class PaymentSerializer(serializers.ModelSerializer):
             "session_id",
             "money_to_pay",
         ]
+
+
+# ?expand= values of the payment endpoints and the fields they add
+EXPANDABLE_PAYMENT_FIELDS = {"book": "book_title", "user": "user_email"}
+
+
+class PaymentExpandedSerializer(PaymentSerializer):
+    book_title: str = serializers.CharField(
+        source="borrowing.book.title", read_only=True
+    )
+    user_email: str = serializers.EmailField(
+        source="borrowing.user.email", read_only=True
+    )
+
+    class Meta(PaymentSerializer.Meta):
+        fields: List[str] = PaymentSerializer.Meta.fields + list(
+            EXPANDABLE_PAYMENT_FIELDS.values()
+        )
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # Only the fields asked for with ?expand= are shown
+        expand = self.context.get("expand")
+        if expand is not None:
+            for name, field_name in EXPANDABLE_PAYMENT_FIELDS.items():
+                if name not in expand:
+                    self.fields.pop(field_name)
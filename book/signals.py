@@ -0,0 +1,60 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import invalidate_catalog_on_commit
+from .counters import BOOKS_COUNTER, count_borrowings, increment_counter
+from .models import Book, Borrowing
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_catalog_on_book_change(sender, **kwargs) -> None:
+    invalidate_catalog_on_commit()
+
+
+@receiver(post_save, sender=Book)
+def count_created_book(sender, instance: Book, created: bool, **kwargs) -> None:
+    if created:
+        increment_counter(BOOKS_COUNTER)
+
+
+@receiver(post_delete, sender=Book)
+def count_deleted_book(sender, instance: Book, **kwargs) -> None:
+    increment_counter(BOOKS_COUNTER, -1)
+
+
+def _borrow_date(instance: Borrowing):
+    # The date may still be the string it was assigned as
+    return Borrowing._meta.get_field("borrow_date").to_python(instance.borrow_date)
+
+
+@receiver(pre_save, sender=Borrowing)
+def recount_moved_borrowing(
+    sender, instance: Borrowing, update_fields=None, **kwargs
+) -> None:
+    if instance._state.adding or (
+        update_fields is not None and "borrow_date" not in update_fields
+    ):
+        return
+    old_borrow_date = (
+        Borrowing.objects.filter(pk=instance.pk)
+        .values_list("borrow_date", flat=True)
+        .first()
+    )
+    new_borrow_date = _borrow_date(instance)
+    if old_borrow_date and old_borrow_date.year != new_borrow_date.year:
+        count_borrowings(old_borrow_date, -1)
+        count_borrowings(new_borrow_date)
+
+
+@receiver(post_save, sender=Borrowing)
+def count_created_borrowing(
+    sender, instance: Borrowing, created: bool, **kwargs
+) -> None:
+    if created:
+        count_borrowings(_borrow_date(instance))
+
+
+@receiver(post_delete, sender=Borrowing)
+def count_deleted_borrowing(sender, instance: Borrowing, **kwargs) -> None:
+    count_borrowings(_borrow_date(instance), -1)
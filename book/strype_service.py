@@ -1,46 +1,427 @@
-import time
-from typing import Tuple
+import asyncio
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from weakref import WeakKeyDictionary
 
+import httpx
 import stripe
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+from stripe.stripe_object import StripeObject
+from stripe.util import convert_to_stripe_object
 
-from book.models import Payment
+from book.http_clients import CircuitOpenError, stripe_async_client, stripe_breaker
+from book.models import Payment, StripeEvent
+from library_service_api.metrics import observe_external_call
+from book.telegram_bot import notify_successful_payments
 
+logger = logging.getLogger(__name__)
 
-def create_payment_session(payment: Payment) -> Tuple[str, str]:
-    stripe.api_key = settings.STRIPE_SECRET_KEY
-    if stripe.api_key:
-        amount = int(payment.money_to_pay * 100)
-        expiration_time = int(time.time()) + (
-            30 * 60
-        )  # Set expiration time to 30 minutes from now
-
-        session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=[
-                {
-                    "price_data": {
-                        "currency": "usd",
-                        "unit_amount": amount,
-                        "product_data": {
-                            "name": payment.borrowing.book.title,
-                            "description": "Book borrowing fee",
-                        },
+
+def _idempotency_key(payments: List[Payment]) -> str:
+    """
+    Key of the creation of the payments' next session, claimed with its
+    deadline. Callers sharing the claim share the key, and Stripe answers
+    them all with the session it created first.
+    """
+    payment_ids = ",".join(str(payment.pk) for payment in payments)
+    previous_session = payments[0].session_id or "none"
+    deadline = int(payments[0].session_expires_at.timestamp())
+    digest = hashlib.sha256(
+        f"{payment_ids}:{previous_session}:{deadline}".encode()
+    ).hexdigest()
+    return f"checkout-{digest}"
+
+
+def _reusable_session(payment: Payment) -> bool:
+    """
+    Whether the session stored on the payment can still be paid
+    """
+    if not (payment.session_id and payment.session_url and payment.session_expires_at):
+        return False
+    margin = timedelta(seconds=settings.STRIPE_SESSION_REUSE_MARGIN)
+    return payment.session_expires_at > timezone.now() + margin
+
+
+def _checkout_session_params(payments: List[Payment], expires_at: datetime) -> Dict:
+    return dict(
+        payment_method_types=["card"],
+        line_items=[
+            {
+                "price_data": {
+                    "currency": "usd",
+                    "unit_amount": int(payment.money_to_pay * 100),
+                    "product_data": {
+                        "name": payment.borrowing.book.title,
+                        "description": "Book borrowing fee",
                     },
-                    "quantity": 1,
-                }
-            ],
-            mode="payment",
-            success_url="http://localhost:8000/success/?session_id={CHECKOUT_SESSION_ID}",
-            cancel_url="http://localhost:8000/cancel/?session_id={CHECKOUT_SESSION_ID}",
-            expires_at=expiration_time,
-        )
+                },
+                "quantity": 1,
+            }
+            for payment in payments
+        ],
+        mode="payment",
+        success_url="http://localhost:8000/success/?session_id={CHECKOUT_SESSION_ID}",
+        cancel_url="http://localhost:8000/cancel/?session_id={CHECKOUT_SESSION_ID}",
+        expires_at=int(expires_at.timestamp()),
+    )
+
 
+def _record_session(payments: List[Payment], session: stripe.checkout.Session) -> None:
+    created_at = timezone.now()
+    for payment in payments:
         payment.session_id = session.id
         payment.session_url = session.url
+        payment.session_created_at = created_at
+
+
+def _create_checkout_session(payments: List[Payment]) -> stripe.checkout.Session:
+    """
+    Create the Stripe session claimed for the payments
+    and record it on them, without saving
+    """
+    if settings.STRIPE_SECRET_KEY:
+        with observe_external_call("stripe", "create_session"):
+            session = stripe.checkout.Session.create(
+                idempotency_key=_idempotency_key(payments),
+                **_checkout_session_params(payments, payments[0].session_expires_at),
+            )
+        _record_session(payments, session)
+        return session
+
+    else:
+        raise Exception("Stripe is unavailable, please provide ur Stripe creds")
+
+
+def _form_encode(params: Dict, prefix: str = "") -> Iterator[Tuple[str, str]]:
+    """
+    Flatten params into Stripe's form encoding,
+    e.g. line_items[0][price_data][currency]=usd
+    """
+    for key, value in params.items():
+        name = f"{prefix}[{key}]" if prefix else str(key)
+        if value is None:
+            continue
+        if isinstance(value, dict):
+            yield from _form_encode(value, name)
+        elif isinstance(value, (list, tuple)):
+            yield from _form_encode(dict(enumerate(value)), name)
+        elif isinstance(value, bool):
+            yield name, "true" if value else "false"
+        else:
+            yield name, str(value)
+
+
+async def _astripe_post(
+    path: str, params: Dict, idempotency_key: Optional[str] = None
+) -> StripeObject:
+    """
+    Stripe API call made with httpx for async views, failures are
+    raised as the stripe library's errors
+    """
+    try:
+        stripe_breaker.before_call()
+    except CircuitOpenError as error:
+        raise stripe.error.APIConnectionError(str(error)) from error
+    try:
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else {}
+        response = await stripe_async_client().post(
+            f"{stripe.api_base}{path}",
+            data=dict(_form_encode(params)),
+            headers=headers,
+            auth=(settings.STRIPE_SECRET_KEY, ""),
+            timeout=settings.STRIPE_REQUEST_TIMEOUT,
+        )
+    except httpx.HTTPError as error:
+        stripe_breaker.record_failure()
+        raise stripe.error.APIConnectionError(str(error)) from error
+
+    if response.status_code >= 500:
+        stripe_breaker.record_failure()
+    else:
+        stripe_breaker.record_success()
+
+    try:
+        body = response.json()
+    except ValueError:
+        body = {}
+    if response.is_error:
+        raise stripe.error.APIError(
+            body.get("error", {}).get("message"),
+            http_body=response.text,
+            http_status=response.status_code,
+            json_body=body,
+        )
+    return convert_to_stripe_object(body, settings.STRIPE_SECRET_KEY)
+
+
+SESSION_FIELDS = [
+    "session_id",
+    "session_url",
+    "session_created_at",
+    "session_expires_at",
+]
+
+
+def _session_in_use(now: datetime) -> Q:
+    """
+    Payments with a session that can still be paid,
+    or one another caller has just claimed
+    """
+    reuse_margin = timedelta(seconds=settings.STRIPE_SESSION_REUSE_MARGIN)
+    lifetime = timedelta(seconds=settings.STRIPE_SESSION_LIFETIME)
+    return Q(session_expires_at__gt=now + reuse_margin) & ~Q(session_url="") | Q(
+        session_url="", session_expires_at__gt=now + lifetime
+    )
+
+
+def _session_claim(payments: List[Payment]) -> Tuple[QuerySet, Dict]:
+    """
+    Payments to claim the creation of a new session for, and the fields
+    claiming it: the deadline it's created with, and no url meanwhile.
+    The deadline leaves a caller STRIPE_SESSION_CLAIM_TIMEOUT seconds
+    to create it for at least STRIPE_SESSION_LIFETIME.
+    """
+    now = timezone.now()
+    expires_at = now + timedelta(
+        seconds=settings.STRIPE_SESSION_LIFETIME + settings.STRIPE_SESSION_CLAIM_TIMEOUT
+    )
+    claimable = Payment.objects.filter(
+        pk__in=[payment.pk for payment in payments]
+    ).exclude(_session_in_use(now))
+    return claimable, {"session_url": "", "session_expires_at": expires_at}
+
+
+def _claimed(payments: List[Payment]) -> QuerySet:
+    # Unless another caller has stored the session or claimed it again
+    return Payment.objects.filter(
+        pk__in=[payment.pk for payment in payments],
+        session_url="",
+        session_expires_at=payments[0].session_expires_at,
+    )
+
+
+def _set_fields(payments: List[Payment], fields: Dict) -> None:
+    for payment in payments:
+        for field, value in fields.items():
+            setattr(payment, field, value)
+
+
+def _create_payments_session(payments: List[Payment]) -> Tuple[str, str]:
+    claimable, claim = _session_claim(payments)
+    if claimable.update(**claim):
+        _set_fields(payments, claim)
+    else:
+        stored = Payment.objects.values(*SESSION_FIELDS).get(pk=payments[0].pk)
+        _set_fields(payments, stored)
+        if _reusable_session(payments[0]):
+            return payments[0].session_id, payments[0].session_url
+
+    # A caller sharing the claim gets the same session from Stripe
+    _create_checkout_session(payments)
+    _claimed(payments).update(
+        **{field: getattr(payments[0], field) for field in SESSION_FIELDS}
+    )
+    return payments[0].session_id, payments[0].session_url
+
+
+def create_payment_session(payment: Payment) -> Tuple[str, str]:
+    """
+    Checkout session for the payment, a still valid one stored on it
+    is reused. No lock is held during the Stripe call: the new session is
+    claimed on the payment first, and concurrent calls create the claimed
+    session under the same idempotency key.
+    """
+    if payment.pk is None:
         payment.save()
+    return _create_payments_session([payment])
 
-        return payment.session_id, payment.session_url
 
+# Session creations running in each event loop, by payment
+_creating_sessions: WeakKeyDictionary = WeakKeyDictionary()
+
+
+async def _acreate_checkout_session(payment: Payment) -> Tuple[str, str]:
+    claimable, claim = _session_claim([payment])
+    if await claimable.aupdate(**claim):
+        _set_fields([payment], claim)
     else:
+        stored = await Payment.objects.values(*SESSION_FIELDS).aget(pk=payment.pk)
+        _set_fields([payment], stored)
+        if _reusable_session(payment):
+            return payment.session_id, payment.session_url
+
+    with observe_external_call("stripe", "create_session"):
+        session = await _astripe_post(
+            "/v1/checkout/sessions",
+            _checkout_session_params([payment], payment.session_expires_at),
+            idempotency_key=_idempotency_key([payment]),
+        )
+    _record_session([payment], session)
+    await _claimed([payment]).aupdate(
+        **{field: getattr(payment, field) for field in SESSION_FIELDS}
+    )
+    return payment.session_id, payment.session_url
+
+
+async def acreate_payment_session(payment: Payment) -> Tuple[str, str]:
+    """
+    create_payment_session for async views, the payment must be saved
+    and loaded with its borrowing's book. Concurrent calls for the same
+    payment share one Stripe call, across processes the claim gets them
+    the same session.
+    """
+    if not settings.STRIPE_SECRET_KEY:
         raise Exception("Stripe is unavailable, please provide ur Stripe creds")
+    if _reusable_session(payment):
+        return payment.session_id, payment.session_url
+
+    creating = _creating_sessions.setdefault(asyncio.get_running_loop(), {})
+    task = creating.get(payment.pk)
+    if task is None:
+        task = asyncio.ensure_future(_acreate_checkout_session(payment))
+        creating[payment.pk] = task
+        task.add_done_callback(lambda _: creating.pop(payment.pk, None))
+    # A cancelled caller doesn't cancel the call the others wait for
+    return await asyncio.shield(task)
+
+
+def create_batch_payment_session(payments: List[Payment]) -> Tuple[str, str]:
+    """
+    One Stripe session that pays for all the given payments at once,
+    claimed and reused like create_payment_session
+    """
+    return _create_payments_session(payments)
+
+
+def _retrieve_session(session_id: str) -> Optional[stripe.checkout.Session]:
+    try:
+        with observe_external_call("stripe", "retrieve_session"):
+            return stripe.checkout.Session.retrieve(session_id)
+    except stripe.error.StripeError:
+        logger.warning(
+            "Failed to retrieve Stripe session %s", session_id, exc_info=True
+        )
+        return None
+
+
+def retrieve_sessions(session_ids: Iterable[str]) -> Dict[str, stripe.checkout.Session]:
+    """
+    Fetch Stripe sessions concurrently, at most CONCURRENT_REQUESTS at a time.
+    Sessions that could not be fetched are left out.
+    """
+    session_ids = list(session_ids)
+    with ThreadPoolExecutor(max_workers=settings.CONCURRENT_REQUESTS) as executor:
+        sessions = executor.map(_retrieve_session, session_ids)
+        return {
+            session_id: session
+            for session_id, session in zip(session_ids, sessions)
+            if session is not None
+        }
+
+
+def session_payment_status(session: stripe.checkout.Session) -> Optional[str]:
+    """
+    Payment status a Stripe session has settled on, None while it is open
+    """
+    if session.payment_status == "paid":
+        return Payment.PAID
+    if session.status == "expired":
+        return Payment.EXPIRED
+    return None
+
+
+# Payment status each checkout event moves its session's payments to
+EVENT_PAYMENT_STATUSES = {
+    "checkout.session.completed": Payment.PAID,
+    "checkout.session.async_payment_succeeded": Payment.PAID,
+    "checkout.session.async_payment_failed": Payment.CANCELED,
+    "checkout.session.expired": Payment.EXPIRED,
+}
+
+
+def record_stripe_event(payload: bytes, signature: str) -> StripeEvent:
+    """
+    Verify a webhook request and store its event in the inbox.
+    Raises ValueError or stripe.error.SignatureVerificationError
+    for requests that don't come from Stripe.
+    """
+    event = stripe.Webhook.construct_event(
+        payload, signature, settings.STRIPE_WEBHOOK_SECRET
+    )
+    # Redelivered events are ignored by the unique event_id
+    StripeEvent.objects.bulk_create(
+        [
+            StripeEvent(
+                event_id=event.id, type=event.type, payload=event.to_dict_recursive()
+            )
+        ],
+        ignore_conflicts=True,
+    )
+    return event
+
+
+def _event_payment_status(event: StripeEvent) -> Optional[str]:
+    new_status = EVENT_PAYMENT_STATUSES.get(event.type)
+    session = event.payload["data"]["object"]
+    # A completed session with a delayed payment method isn't paid yet
+    if event.type == "checkout.session.completed" and (
+        session.get("payment_status") != "paid"
+    ):
+        return None
+    return new_status
+
+
+def apply_stripe_events(batch_size: int = None) -> int:
+    """
+    Apply pending inbox events to payments, oldest first.
+    Returns the number of processed events.
+    """
+    with transaction.atomic():
+        events = list(
+            StripeEvent.objects.select_for_update(skip_locked=True)
+            .filter(status=StripeEvent.PENDING)
+            .order_by("id")[: batch_size or settings.STRIPE_EVENTS_BATCH_SIZE]
+        )
+
+        # The latest event about a session wins
+        session_statuses: Dict[str, str] = {}
+        for event in events:
+            new_status = _event_payment_status(event)
+            if new_status:
+                session_statuses[event.payload["data"]["object"]["id"]] = new_status
+
+        sessions_by_status: Dict[str, List[str]] = {}
+        for session_id, new_status in session_statuses.items():
+            sessions_by_status.setdefault(new_status, []).append(session_id)
+
+        # A payment may be expired locally before Stripe reports it paid
+        paid_payments = list(
+            Payment.objects.filter(
+                session_id__in=sessions_by_status.pop(Payment.PAID, [])
+            )
+            .exclude(status=Payment.PAID)
+            .select_related("borrowing__book", "borrowing__user")
+        )
+        Payment.objects.filter(pk__in=[payment.pk for payment in paid_payments]).update(
+            status=Payment.PAID
+        )
+        for payment in paid_payments:
+            payment.status = Payment.PAID
+        notify_successful_payments(paid_payments)
+
+        for new_status, session_ids in sessions_by_status.items():
+            Payment.objects.filter(
+                session_id__in=session_ids, status=Payment.PENDING
+            ).update(status=new_status)
+
+        StripeEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+            status=StripeEvent.PROCESSED, processed_at=timezone.now()
+        )
+
+    return len(events)
@@ -1,35 +1,187 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import List
+
 import stripe
 from django.conf import settings
-from django.utils.datetime_safe import datetime
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
 
 from book.models import Borrowing, Payment
-from book.telegram_bot import notify_overdue_borrowing
+from book.strype_service import (
+    apply_stripe_events,
+    create_batch_payment_session,
+    create_payment_session,
+    retrieve_sessions,
+    session_payment_status,
+)
+from book.telegram_bot import (
+    deliver_pending_messages,
+    notify_overdue_borrowing,
+    notify_successful_payments,
+)
+
+from celery import Task, shared_task
 
-from celery import shared_task
+logger = logging.getLogger(__name__)
 
 
 @shared_task
 def run_sync_with_api() -> None:
-    notify_overdue_borrowing(Borrowing.objects.all())
+    # Only overdue borrowings are read, streamed with their book and user
+    overdue_borrowings = (
+        Borrowing.objects.overdue()
+        .select_related("book", "user")
+        .only("expected_return_date", "book__title", "user__email")
+        .order_by("expected_return_date", "id")
+    )
+    notify_overdue_borrowing(overdue_borrowings.iterator(chunk_size=2000))
 
 
 @shared_task
-def check_expired_sessions() -> None:
-    # Get all Payment objects that are still pending
-    pending_payments = Payment.objects.filter(status=Payment.PENDING)
-
-    # Loop through all pending payments and check if the Stripe session has expired
-    for payment in pending_payments:
-        # Retrieve the Stripe session using the Stripe API
-        stripe.api_key = settings.STRIPE_SECRET_KEY
-        session = stripe.checkout.Session.retrieve(payment.session_id)
-
-        # Check if the session has expired
-        now = datetime.now().timestamp()
-        expiration_time = session.created + session.expires_at
-        is_expired = expiration_time < now
-
-        # If the session has expired, update the Payment status to EXPIRED
-        if is_expired:
-            payment.status = Payment.EXPIRED
-            payment.save()
+def send_pending_telegram_messages() -> int:
+    return deliver_pending_messages()
+
+
+@shared_task
+def apply_pending_stripe_events() -> int:
+    return apply_stripe_events()
+
+
+def delay_on_commit(task: Task, *args) -> None:
+    """
+    Queue the task once the current transaction commits. If the broker
+    is down, the committed request still succeeds and the failure is logged.
+    """
+
+    def delay() -> None:
+        try:
+            task.delay(*args)
+        except Exception:
+            logger.warning("Failed to queue %s%r", task.name, args, exc_info=True)
+
+    transaction.on_commit(delay)
+
+
+# Session creation outlasts a Stripe outage that opened the circuit,
+# payments it gives up on are picked up by create_missing_checkout_sessions
+SESSION_TASK_OPTIONS = dict(
+    autoretry_for=(
+        stripe.error.APIConnectionError,
+        stripe.error.APIError,
+        stripe.error.RateLimitError,
+    ),
+    retry_backoff=True,
+    max_retries=settings.PAYMENT_SESSION_TASK_RETRIES,
+)
+
+
+@shared_task(**SESSION_TASK_OPTIONS)
+def create_payment_checkout_session(payment_id: int) -> None:
+    # Retries reuse the session an earlier attempt stored, or get
+    # the one Stripe created for its idempotency key
+    payment = (
+        Payment.objects.select_related("borrowing__book")
+        .filter(pk=payment_id, status=Payment.PENDING)
+        .first()
+    )
+    if payment is not None:
+        create_payment_session(payment)
+
+
+@shared_task(**SESSION_TASK_OPTIONS)
+def create_batch_checkout_session(payment_ids: List[int]) -> None:
+    """
+    One session paying for those of the payments still without one,
+    e.g. the payments of a bulk return
+    """
+    payments = list(
+        Payment.objects.select_related("borrowing__book")
+        .filter(pk__in=payment_ids, status=Payment.PENDING, session_id="")
+        .order_by("id")
+    )
+    if payments:
+        create_batch_payment_session(payments)
+
+
+@shared_task
+def create_missing_checkout_sessions() -> int:
+    """
+    Queue session creation again for pending payments left without a
+    session, e.g. when the broker was down or the task gave up.
+    Payments of a bulk return get one session again.
+    """
+    created_before = timezone.now() - timedelta(
+        seconds=settings.PAYMENT_SESSION_RECOVERY_DELAY
+    )
+    payments = (
+        Payment.objects.filter(
+            status=Payment.PENDING, session_id="", created_at__lt=created_before
+        )
+        .values_list("id", "batch_id")
+        .order_by("id")
+    )
+    batches = defaultdict(list)
+    for payment_id, batch_id in payments:
+        if batch_id is None:
+            create_payment_checkout_session.delay(payment_id)
+        else:
+            batches[batch_id].append(payment_id)
+    for payment_ids in batches.values():
+        create_batch_checkout_session.delay(payment_ids)
+    return len(payments)
+
+
+@shared_task
+def check_expired_sessions() -> int:
+    now = timezone.now()
+    grace = timedelta(seconds=settings.STRIPE_EXPIRY_GRACE)
+    pending_payments = Payment.objects.filter(status=Payment.PENDING).exclude(
+        session_id=""
+    )
+
+    # Well past their deadline, Stripe can't have taken the payment
+    expired_count = pending_payments.filter(session_expires_at__lt=now - grace).update(
+        status=Payment.EXPIRED
+    )
+
+    # Only sessions that have just expired, or whose deadline isn't known,
+    # are checked with Stripe. Payments made before the deadline arrive
+    # through the webhook.
+    boundary_payments = list(
+        pending_payments.filter(
+            Q(session_expires_at__lte=now) | Q(session_expires_at__isnull=True)
+        ).select_related("borrowing__book", "borrowing__user")
+    )
+
+    # Fetch each Stripe session once, concurrently
+    sessions = retrieve_sessions({payment.session_id for payment in boundary_payments})
+
+    changed_payments = []
+    for payment in boundary_payments:
+        session = sessions.get(payment.session_id)
+        new_status = session and session_payment_status(session)
+        if new_status:
+            payment.status = new_status
+            changed_payments.append(payment)
+        elif (
+            session and payment.session_expires_at is None and session.get("expires_at")
+        ):
+            payment.session_expires_at = datetime.fromtimestamp(
+                session["expires_at"], tz=dt_timezone.utc
+            )
+            changed_payments.append(payment)
+
+    with transaction.atomic():
+        Payment.objects.bulk_update(
+            changed_payments, ["status", "session_expires_at"], batch_size=1000
+        )
+        notify_successful_payments(
+            [payment for payment in changed_payments if payment.status == Payment.PAID]
+        )
+
+    return expired_count + sum(
+        payment.status != Payment.PENDING for payment in changed_payments
+    )
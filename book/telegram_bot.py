@@ -1,64 +1,231 @@
-from typing import List
+import logging
+import random
+import time
+from datetime import timedelta
+from typing import Dict, Iterable, Iterator, List
 
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 from django.conf import settings
 
 import requests
-from django.core.exceptions import ObjectDoesNotExist
 
-from book.models import Payment, Borrowing
+from book.http_clients import telegram_session
+from book.models import Payment, Borrowing, TelegramMessage
+from customer.models import User
+from library_service_api.metrics import observe_external_call
+
+logger = logging.getLogger(__name__)
 
 
 def send_telegram_message(message: str) -> dict:
     if settings.TELEGRAM_BOT_TOKEN and settings.TELEGRAM_CHAT_ID:
         url = (
-            f""
-            f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/"
-            f"sendMessage?chat_id={settings.TELEGRAM_CHAT_ID}&text={message}"
+            f"{settings.TELEGRAM_API_URL}/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
         )
-        return requests.get(url).json()  # this sends the message
+        with observe_external_call("telegram", "send_message"):
+            response = telegram_session.post(
+                url,
+                json={"chat_id": settings.TELEGRAM_CHAT_ID, "text": message},
+            )
+            return response.json()
     else:
         raise Exception(
             "Telegram sender service is unavailable, please provide ur Telegram bot settings"
         )
 
 
-def notify_borrowing_created(instance: Borrowing) -> dict:
+def enqueue_telegram_message(message: str) -> TelegramMessage:
+    """
+    Store the message in the outbox, it's sent after the current
+    transaction commits by the send_pending_telegram_messages task
+    """
+    return TelegramMessage.objects.create(text=message)
+
+
+def _claim_messages(batch_size: int) -> List[TelegramMessage]:
+    now = timezone.now()
+    with transaction.atomic():
+        messages = list(
+            TelegramMessage.objects.select_for_update(skip_locked=True)
+            .filter(status=TelegramMessage.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        # Hide claimed messages from other workers while they are being sent
+        TelegramMessage.objects.filter(
+            pk__in=[message.pk for message in messages]
+        ).update(
+            next_attempt_at=now + timedelta(seconds=settings.TELEGRAM_CLAIM_TIMEOUT)
+        )
+    return messages
+
+
+def _combine(messages: List[TelegramMessage]) -> Iterator[List[TelegramMessage]]:
+    """
+    Group messages into as few Telegram messages as the size limit allows
+    """
+    chunk: List[TelegramMessage] = []
+    length = 0
+    for message in messages:
+        if chunk and length + len(message.text) + 2 > settings.TELEGRAM_MESSAGE_LIMIT:
+            yield chunk
+            chunk, length = [], 0
+        chunk.append(message)
+        length += len(message.text) + 2
+    if chunk:
+        yield chunk
+
+
+def _mark_sent(messages: List[TelegramMessage]) -> None:
+    TelegramMessage.objects.filter(pk__in=[message.pk for message in messages]).update(
+        status=TelegramMessage.SENT,
+        sent_at=timezone.now(),
+        attempts=F("attempts") + 1,
+        last_error="",
+    )
+
+
+def _schedule_retry(messages: List[TelegramMessage], error: str) -> None:
+    now = timezone.now()
+    for message in messages:
+        message.attempts += 1
+        message.last_error = error
+        if message.attempts >= settings.TELEGRAM_MAX_ATTEMPTS:
+            message.status = TelegramMessage.FAILED
+        else:
+            # Exponential backoff with jitter
+            delay = settings.TELEGRAM_RETRY_BACKOFF * 2 ** (message.attempts - 1)
+            message.next_attempt_at = now + timedelta(
+                seconds=random.uniform(delay / 2, delay)
+            )
+    TelegramMessage.objects.bulk_update(
+        messages, ["attempts", "last_error", "status", "next_attempt_at"]
+    )
+
+
+def _postpone(messages: List[TelegramMessage], seconds: int) -> None:
+    TelegramMessage.objects.filter(pk__in=[message.pk for message in messages]).update(
+        next_attempt_at=timezone.now() + timedelta(seconds=seconds)
+    )
+
+
+def deliver_pending_messages(batch_size: int = None) -> int:
+    """
+    Send due outbox messages respecting the Telegram rate limit.
+    Returns the number of delivered messages.
+    """
+    if not (settings.TELEGRAM_BOT_TOKEN and settings.TELEGRAM_CHAT_ID):
+        logger.warning("Telegram bot settings are missing, outbox is not delivered")
+        return 0
+
+    messages = _claim_messages(batch_size or settings.TELEGRAM_OUTBOX_BATCH_SIZE)
+    chunks = list(_combine(messages))
+    min_interval = 1 / settings.TELEGRAM_MESSAGES_PER_SECOND
+    delivered = 0
+    last_sent_at = None
+
+    for index, chunk in enumerate(chunks):
+        if last_sent_at is not None:
+            time.sleep(max(0.0, min_interval - (time.monotonic() - last_sent_at)))
+        last_sent_at = time.monotonic()
+
+        try:
+            result = send_telegram_message("\n\n".join(m.text for m in chunk))
+        except (requests.RequestException, ValueError) as error:
+            _schedule_retry(chunk, str(error))
+            continue
+
+        if result.get("ok"):
+            _mark_sent(chunk)
+            delivered += len(chunk)
+        elif result.get("error_code") == 429:
+            # Telegram tells how long to back off, keep the rest for later
+            retry_after = result.get("parameters", {}).get("retry_after", 1)
+            _postpone([m for rest in chunks[index:] for m in rest], retry_after)
+            break
+        else:
+            _schedule_retry(chunk, result.get("description", "Unknown error"))
+
+    return delivered
+
+
+def notify_borrowing_created(instance: Borrowing) -> TelegramMessage:
     message = (
         f"New borrowing created: {instance.user.email} borrowed {instance.book.title}"
     )
-    return send_telegram_message(message)
-
-
-def notify_overdue_borrowing(instance: List[Borrowing]) -> dict:
-    today = timezone.now().date()
-    overdue_borrowings = []
-    for borrowing in instance:
-        if borrowing.expected_return_date < today and not borrowing.actual_return_date:
-            overdue_borrowings.append(borrowing)
-
-    if overdue_borrowings:
-        message = "Overdue borrowings: "
-        for borrowing in overdue_borrowings:
-            try:
-                book_title = borrowing.book.title
-            except ObjectDoesNotExist:
-                book_title = "Unknown book"
-            message += (
-                f"{borrowing.user.email} "
-                f"should have returned {book_title} "
-                f"by {borrowing.expected_return_date}"
-            )
-        return send_telegram_message(message)
-    else:
-        return send_telegram_message("No borrowings overdue today!")
+    return enqueue_telegram_message(message)
+
 
+def notify_bulk_borrowing_created(
+    user: User, borrowings: List[Borrowing]
+) -> TelegramMessage:
+    titles = ", ".join(borrowing.book.title for borrowing in borrowings)
+    message = f"New borrowings created: {user.email} borrowed {titles}"
+    return enqueue_telegram_message(message)
 
-def notify_successful_payment(instance: Payment) -> dict:
+
+def _split_message(header: str, lines: Iterable[str]) -> Iterator[str]:
+    """
+    Split a long report into messages under the Telegram size limit
+    """
+    message = header
+    for line in lines:
+        too_long = len(message) + len(line) + 1 > settings.TELEGRAM_MESSAGE_LIMIT
+        if too_long and message != header:
+            yield message
+            message = header
+        message += f"\n{line}"
+    if message != header:
+        yield message
+
+
+def notify_overdue_borrowing(
+    overdue_borrowings: Iterable[Borrowing],
+) -> List[TelegramMessage]:
+    lines = (
+        f"{borrowing.user.email} "
+        f"should have returned {borrowing.book.title} "
+        f"by {borrowing.expected_return_date}"
+        for borrowing in overdue_borrowings
+    )
+    messages = list(_split_message("Overdue borrowings:", lines)) or [
+        "No borrowings overdue today!"
+    ]
+    return TelegramMessage.objects.bulk_create(
+        [TelegramMessage(text=message) for message in messages]
+    )
+
+
+def notify_successful_payment(instance: Payment) -> TelegramMessage:
     message = (
         f"Successful payment: "
         f"{instance.borrowing.user.email} "
         f"paid {instance.money_to_pay} "
         f"for {instance.borrowing.book.title}"
     )
-    return send_telegram_message(message)
+    return enqueue_telegram_message(message)
+
+
+def notify_successful_payments(payments: List[Payment]) -> List[TelegramMessage]:
+    """
+    One message per checkout session, the payments of a bulk return share one
+    """
+    sessions: Dict[str, List[Payment]] = {}
+    for payment in payments:
+        sessions.setdefault(payment.session_id, []).append(payment)
+    messages = []
+    for session_payments in sessions.values():
+        if len(session_payments) == 1:
+            messages.append(notify_successful_payment(session_payments[0]))
+            continue
+        total = sum(payment.money_to_pay for payment in session_payments)
+        titles = ", ".join(payment.borrowing.book.title for payment in session_payments)
+        message = (
+            f"Successful payment: "
+            f"{session_payments[0].borrowing.user.email} "
+            f"paid {total} "
+            f"for {titles}"
+        )
+        messages.append(enqueue_telegram_message(message))
+    return messages
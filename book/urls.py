@@ -6,11 +6,17 @@ from .views import (
     BorrowingList,
     BorrowingDetail,
     BorrowingReturn,
+    BorrowingExport,
+    BulkBorrowingCreate,
+    BulkBorrowingReturn,
     PaymentListView,
+    PaymentExport,
+    PaymentSessionView,
     initiate_payment,
     payment_success,
     payment_cancel,
     payment_detail_view,
+    stripe_webhook,
 )
 
 urlpatterns = [
@@ -18,6 +24,17 @@ urlpatterns = [
     path("books/<int:pk>/", BookDetail.as_view(), name="book-detail"),
     path("borrowings/", BorrowingList.as_view(), name="borrowing-list"),
     path("borrowings/<int:pk>/", BorrowingDetail.as_view(), name="borrowing-detail"),
+    path("borrowings/export/", BorrowingExport.as_view(), name="borrowing-export"),
+    path(
+        "borrowings/bulk/",
+        BulkBorrowingCreate.as_view(),
+        name="borrowing-bulk-create",
+    ),
+    path(
+        "borrowings/bulk/return/",
+        BulkBorrowingReturn.as_view(),
+        name="borrowing-bulk-return",
+    ),
     path(
         "initiate_payment/<int:payment_id>/", initiate_payment, name="initiate_payment"
     ),
@@ -27,9 +44,16 @@ urlpatterns = [
         name="borrowing-return",
     ),
     path("payments/", PaymentListView.as_view(), name="payments-list"),
+    path("payments/export/", PaymentExport.as_view(), name="payment-export"),
     path("payments/<int:pk>/", payment_detail_view, name="payment-detail"),
+    path(
+        "payments/<int:pk>/session/",
+        PaymentSessionView.as_view(),
+        name="payment-session",
+    ),
     path("success/", payment_success, name="payment_success"),
     path("cancel/", payment_cancel, name="payment_cancel"),
+    path("stripe/webhook/", stripe_webhook, name="stripe-webhook"),
 ]
 
 
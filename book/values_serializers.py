@@ -0,0 +1,114 @@
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple, Type
+
+from rest_framework import ISO_8601, relations, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+Formatter = Optional[Callable[[Any], Any]]
+
+# Fields whose representation of a database value is the value itself
+PASSTHROUGH_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+    relations.PrimaryKeyRelatedField,
+)
+
+
+def _decimal_formatter(field: serializers.DecimalField) -> Formatter:
+    coerce_to_string = getattr(
+        field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING
+    )
+    if coerce_to_string and not field.localize and field.decimal_places is not None:
+        decimal_format = f".{field.decimal_places}f"
+        return lambda value: format(value, decimal_format)
+    return field.to_representation
+
+
+def _date_formatter(field: serializers.DateField) -> Formatter:
+    output_format = getattr(field, "format", api_settings.DATE_FORMAT)
+    if output_format is None:
+        return None
+    if output_format.lower() == ISO_8601:
+        return lambda value: value.isoformat()
+    return field.to_representation
+
+
+def _formatter(field: serializers.Field) -> Formatter:
+    if isinstance(field, PASSTHROUGH_FIELDS) and not getattr(field, "pk_field", None):
+        return None
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_formatter(field)
+    if isinstance(field, serializers.DateField):
+        return _date_formatter(field)
+    return field.to_representation
+
+
+class ValuesSerializer:
+    """
+    Read-only counterpart of a DRF serializer working on values() rows.
+    Field lookups and formatters are worked out once, so a row costs
+    a dict lookup and at most a format call per field.
+    """
+
+    def __init__(
+        self, serializer_class: Type[serializers.Serializer], exclude: FrozenSet[str]
+    ) -> None:
+        self.columns: List[Tuple[str, str, Formatter]] = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only or name in exclude:
+                continue
+            if field.source == "*":
+                raise ValueError(
+                    f"{serializer_class.__name__}.{name} can't be read from values()"
+                )
+            lookup = "__".join(field.source_attrs)
+            self.columns.append((name, lookup, _formatter(field)))
+
+    @property
+    def lookups(self) -> List[str]:
+        return [lookup for _, lookup, _ in self.columns]
+
+    def to_representation(self, rows: Iterable[Dict]) -> List[Dict]:
+        columns = self.columns
+        return [
+            {
+                name: row[lookup]
+                if formatter is None or row[lookup] is None
+                else formatter(row[lookup])
+                for name, lookup, formatter in columns
+            }
+            for row in rows
+        ]
+
+
+@lru_cache(maxsize=None)
+def values_serializer(
+    serializer_class: Type[serializers.Serializer],
+    exclude: FrozenSet[str] = frozenset(),
+) -> ValuesSerializer:
+    return ValuesSerializer(serializer_class, exclude)
+
+
+class ValuesListMixin:
+    """
+    List GETs of a generic view serialized from values() rows
+    instead of model instances and the view's serializer
+    """
+
+    def get_values_exclude(self) -> FrozenSet[str]:
+        return frozenset()
+
+    def list(self, request, *args, **kwargs):
+        serializer = values_serializer(
+            self.get_serializer_class(), self.get_values_exclude()
+        )
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.values(*serializer.lookups)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.to_representation(page))
+        return Response(serializer.to_representation(rows))
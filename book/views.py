@@ -1,36 +1,87 @@
 import decimal
-from typing import List
+import uuid
+from typing import FrozenSet, List
 
 import stripe
 from django.conf import settings
 from django.db import transaction
 from django.db.models import Q, QuerySet
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.utils import timezone
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import generics, status, permissions, viewsets, mixins
 from rest_framework.permissions import SAFE_METHODS, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 
+from customer.authentication import get_full_user
+from library_service_api.profiling import query_budget
+
+from .cache import cached_catalog_response
+from .counters import count_borrowings
+from .exports import CONTENT_TYPES, export_response
+from .inventory import release_book, release_books, reserve_book, reserve_books
 from .models import Book, Borrowing, Payment
+from .pagination import BookListPagination, NewestFirstCursorPagination
 from .serializers import (
     BookSerializer,
     BorrowingSerializer,
     BorrowingReturnSerializer,
+    BulkBorrowingReturnSerializer,
+    BulkBorrowingSerializer,
     PaymentSerializer,
+    PaymentExpandedSerializer,
+    EXPANDABLE_PAYMENT_FIELDS,
+)
+from .search import search_books
+from .strype_service import acreate_payment_session, record_stripe_event
+from .tasks import (
+    create_batch_checkout_session,
+    create_payment_checkout_session,
+    delay_on_commit,
+)
+from .telegram_bot import (
+    notify_borrowing_created,
+    notify_bulk_borrowing_created,
 )
-from .strype_service import create_payment_session
-from .telegram_bot import notify_borrowing_created, notify_successful_payment
+from .values_serializers import ValuesListMixin
+
+
+def calculate_payment(borrowing: Borrowing) -> decimal.Decimal:
+    book = borrowing.book
+    actual_date = borrowing.actual_return_date
+    expected_date = borrowing.expected_return_date
+    days_borrowed = (expected_date - borrowing.borrow_date).days
+    overdue_days = (actual_date - expected_date).days
+    money_to_pay = 0
+
+    if overdue_days > 0:
+        money_to_pay = (days_borrowed * book.daily_fee) + (
+            overdue_days * settings.FINE_MULTIPLIER
+        )
 
+    if days_borrowed > 0 and overdue_days == 0:
+        money_to_pay = days_borrowed * book.daily_fee
 
-class BookList(generics.ListCreateAPIView):
+    return money_to_pay
+
+
+class BookList(ValuesListMixin, generics.ListCreateAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = BookListPagination
+    query_budget = 3
 
     def get_queryset(self) -> QuerySet[Book]:
-        queryset = Book.objects.all()
+        queryset = Book.objects.order_by("id")
+        query = self.request.query_params.get("q")
         title = self.request.query_params.get("title")
+        if query is not None:
+            queryset = search_books(queryset, query)
         if title is not None:
             queryset = queryset.filter(title__icontains=title)
         return queryset
@@ -42,6 +93,12 @@ class BookList(generics.ListCreateAPIView):
 
     @extend_schema(
         parameters=[
+            OpenApiParameter(
+                name="q",
+                description="Full-text search by title and author, ordered by relevance",
+                required=False,
+                type=str,
+            ),
             OpenApiParameter(
                 name="title",
                 description="Filter by title insensitive contains",
@@ -52,51 +109,78 @@ class BookList(generics.ListCreateAPIView):
     )
     def get(self, request, *args, **kwargs) -> Response:
         """
-        List of books with filter by title
+        List of books with full-text search and filter by title
         """
         return self.list(request, *args, **kwargs)
 
+    def list(self, request, *args, **kwargs) -> Response:
+        return cached_catalog_response(
+            "books",
+            request,
+            lambda: super(BookList, self).list(request, *args, **kwargs),
+        )
+
 
 class BookDetail(generics.RetrieveUpdateDestroyAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    query_budget = 7
+
+    def retrieve(self, request, *args, **kwargs) -> Response:
+        return cached_catalog_response(
+            f"book:{kwargs['pk']}",
+            request,
+            lambda: super(BookDetail, self).retrieve(request, *args, **kwargs),
+        )
 
 
-class BorrowingList(generics.ListCreateAPIView):
+class BorrowingList(ValuesListMixin, generics.ListCreateAPIView):
     queryset = Borrowing.objects.all().select_related("book")
     serializer_class = BorrowingSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = NewestFirstCursorPagination
+    query_budget = 7
 
     def create(self, request, *args, **kwargs) -> Response:
-        book_id = request.data.get("book")
-        book = Book.objects.get(id=book_id)
-        if book.inventory == 0:
-            return Response(
-                {"error": "The selected book is not available for borrowing."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        # Check if the user has any pending payments
-        if Payment.objects.filter(
-            borrowing__user=request.user, status=Payment.PENDING
-        ).exists():
-            return Response(
-                {
-                    "error": "You have pending payments, please pay them before borrowing a new book."
-                },
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        # Decrement the book's inventory by 1
-        book.inventory -= 1
-        book.save()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-        # Create the borrowing instance
-        return super().create(request, *args, **kwargs)
+        with transaction.atomic():
+            # Check if the user has any pending payments
+            if Payment.objects.filter(
+                borrowing__user_id=request.user.id, status=Payment.PENDING
+            ).exists():
+                return Response(
+                    {
+                        "error": "You have pending payments, please pay them before borrowing a new book."
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            # Take a copy of the book in the same transaction as the borrowing
+            if not reserve_book(serializer.validated_data["book"].id):
+                return Response(
+                    {"error": "The selected book is not available for borrowing."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            borrowing: Borrowing = serializer.save()
+            notify_borrowing_created(borrowing)
+
+        headers = self.get_success_headers(serializer.data)
+        return Response(
+            serializer.data, status=status.HTTP_201_CREATED, headers=headers
+        )
+
+    def get_values_exclude(self) -> FrozenSet[str]:
+        # Same as BorrowingSerializer.to_representation does for GET
+        if self.request.user.is_superuser:
+            return frozenset()
+        return frozenset({"user_id"})
 
     def get_queryset(self) -> QuerySet[Borrowing]:
-        queryset = super().get_queryset().filter(user=self.request.user)
+        queryset = super().get_queryset().filter(user_id=self.request.user.id)
         user_id = self.request.query_params.get("user_id")
         is_active = self.request.query_params.get("is_active")
 
@@ -118,20 +202,18 @@ class BorrowingList(generics.ListCreateAPIView):
 
         return queryset
 
-    def perform_create(self, serializer) -> None:
-        borrowing: Borrowing = serializer.save()
-        notify_borrowing_created(borrowing)
-
 
 class BorrowingDetail(generics.RetrieveUpdateDestroyAPIView):
     queryset = Borrowing.objects.all()
     serializer_class = BorrowingSerializer
+    query_budget = 4
 
 
 class BorrowingReturn(generics.GenericAPIView):
-    queryset = Borrowing.objects.all()
+    # The borrowing is locked while it's returned and paid for
+    queryset = Borrowing.objects.select_related("book").select_for_update()
     serializer_class = BorrowingReturnSerializer
-    payment_serializer_class = PaymentSerializer
+    query_budget = 4
 
     @transaction.atomic
     def post(self, request, *args, **kwargs) -> Response:
@@ -142,127 +224,387 @@ class BorrowingReturn(generics.GenericAPIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
         borrowing.actual_return_date = timezone.now().date()
-        borrowing.book.inventory += 1
-        borrowing.book.save()
-        borrowing.save()
-
-        # Create payment for the returned borrowing
-        payment_data = {
-            "borrowing": borrowing.id,
-            "status": "PENDING",
-            "type": "FINE"
-            if borrowing.actual_return_date > borrowing.expected_return_date
-            else "PAYMENT",
-            "money_to_pay": self.payment_count(),
-        }
-        serializer = PaymentSerializer(data=payment_data, partial=True)
-        serializer.is_valid(raise_exception=True)
-        payment = serializer.save()
+        borrowing.save(update_fields=["actual_return_date"])
+        release_book(borrowing.book_id)
 
-        # Initiate payment session with Stripe
-        initiate_payment(request, payment.id)
+        payment = Payment.objects.create(
+            borrowing=borrowing,
+            status=Payment.PENDING,
+            type=Payment.FINE_TYPE
+            if borrowing.actual_return_date > borrowing.expected_return_date
+            else Payment.PAYMENT_TYPE,
+            money_to_pay=calculate_payment(borrowing),
+        )
+        # Stripe is called by a worker once the return is committed,
+        # not while the borrowing and book are locked
+        delay_on_commit(create_payment_checkout_session, payment.pk)
 
         serializer = self.get_serializer(borrowing)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(
+            {
+                **serializer.data,
+                "payment": payment.pk,
+                "payment_session_url": reverse(
+                    "book:payment-session", kwargs={"pk": payment.pk}
+                ),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class BulkBorrowingCreate(generics.GenericAPIView):
+    serializer_class = BulkBorrowingSerializer
+    permission_classes = [IsAuthenticated]
+    query_budget = 7
 
-    def payment_count(self) -> decimal:
-        borrowing = self.get_object()
-        book = borrowing.book
-        actual_date = borrowing.actual_return_date
-        expected_date = borrowing.expected_return_date
-        days_borrowed = (expected_date - borrowing.borrow_date).days
-        overdue_days = (actual_date - expected_date).days
-        money_to_pay = 0
-
-        if overdue_days > 0:
-            money_to_pay = (days_borrowed * book.daily_fee) + (
-                overdue_days * settings.FINE_MULTIPLIER
+    def post(self, request, *args, **kwargs) -> Response:
+        """
+        Borrow a cart of books in one transaction
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        books: List[Book] = serializer.validated_data["books"]
+
+        user = get_full_user(request.user)
+        with transaction.atomic():
+            # Check if the user has any pending payments
+            if Payment.objects.filter(
+                borrowing__user_id=request.user.id, status=Payment.PENDING
+            ).exists():
+                return Response(
+                    {
+                        "error": "You have pending payments, please pay them before borrowing a new book."
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            if not reserve_books([book.id for book in books]):
+                return Response(
+                    {"error": "Some of the selected books are not available."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            borrowings = Borrowing.objects.bulk_create(
+                [
+                    Borrowing(
+                        book=book,
+                        user=user,
+                        borrow_date=serializer.validated_data["borrow_date"],
+                        expected_return_date=serializer.validated_data[
+                            "expected_return_date"
+                        ],
+                    )
+                    for book in books
+                ]
             )
+            # bulk_create doesn't send the signals that keep the counter
+            count_borrowings(serializer.validated_data["borrow_date"], len(borrowings))
+            notify_bulk_borrowing_created(user, borrowings)
 
-        if days_borrowed > 0 and overdue_days == 0:
-            money_to_pay = days_borrowed * book.daily_fee
+        serializer = BorrowingSerializer(
+            borrowings, many=True, context=self.get_serializer_context()
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        return money_to_pay
 
+class BulkBorrowingReturn(generics.GenericAPIView):
+    serializer_class = BulkBorrowingReturnSerializer
+    permission_classes = [IsAuthenticated]
+    query_budget = 5
 
-class PaymentListView(generics.ListCreateAPIView):
-    queryset = Payment.objects.all()
-    serializer_class = PaymentSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    @transaction.atomic
+    def post(self, request, *args, **kwargs) -> Response:
+        """
+        Return a cart of borrowings and pay for them with one Stripe session
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        borrowing_ids: List[int] = serializer.validated_data["borrowings"]
+
+        queryset = Borrowing.objects.select_related("book").select_for_update()
+        if not request.user.is_superuser:
+            queryset = queryset.filter(user_id=request.user.id)
+        borrowings = list(
+            queryset.filter(pk__in=borrowing_ids, actual_return_date__isnull=True)
+        )
+        if len(borrowings) != len(borrowing_ids):
+            return Response(
+                {"error": "Some borrowings do not exist or were already returned."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        today = timezone.now().date()
+        for borrowing in borrowings:
+            borrowing.actual_return_date = today
+        Borrowing.objects.bulk_update(borrowings, ["actual_return_date"])
+        release_books([borrowing.book_id for borrowing in borrowings])
+
+        batch_id = uuid.uuid4()
+        payments = Payment.objects.bulk_create(
+            [
+                Payment(
+                    borrowing=borrowing,
+                    batch_id=batch_id,
+                    status=Payment.PENDING,
+                    type=Payment.FINE_TYPE
+                    if borrowing.actual_return_date > borrowing.expected_return_date
+                    else Payment.PAYMENT_TYPE,
+                    money_to_pay=calculate_payment(borrowing),
+                )
+                for borrowing in borrowings
+            ]
+        )
+
+        # One Stripe session pays for the whole cart, created by a worker
+        # once the return is committed
+        payment_ids = [payment.pk for payment in payments]
+        delay_on_commit(create_batch_checkout_session, payment_ids)
+
+        serializer = BorrowingReturnSerializer(borrowings, many=True)
+        return Response(
+            {
+                "borrowings": serializer.data,
+                "payments": payment_ids,
+                "payment_session_url": reverse(
+                    "book:payment-session", kwargs={"pk": payment_ids[0]}
+                ),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class PaymentViewMixin:
+    """
+    Payments of the user, or all of them for a superuser, loaded with
+    their borrowing's book and user
+    """
+
+    def get_expand(self) -> FrozenSet[str]:
+        expand = self.request.query_params.get("expand", "").split(",")
+        return frozenset(name for name in expand if name in EXPANDABLE_PAYMENT_FIELDS)
 
     def get_queryset(self) -> QuerySet[Payment]:
-        # Get payments only for the authenticated user, or all payments for superuser
+        queryset = Payment.objects.select_related("borrowing__book", "borrowing__user")
         if self.request.user.is_superuser:
-            return Payment.objects.all()
-        else:
-            return Payment.objects.filter(borrowing__user=self.request.user)
+            return queryset
+        return queryset.filter(borrowing__user_id=self.request.user.id)
+
+    def get_serializer_class(self):
+        if self.request.method in SAFE_METHODS and self.get_expand():
+            return PaymentExpandedSerializer
+        return PaymentSerializer
+
+    def get_serializer_context(self) -> dict:
+        context = super().get_serializer_context()
+        context["expand"] = self.get_expand()
+        return context
+
+    def get_values_exclude(self) -> FrozenSet[str]:
+        expand = self.get_expand()
+        return frozenset(
+            field_name
+            for name, field_name in EXPANDABLE_PAYMENT_FIELDS.items()
+            if name not in expand
+        )
+
+
+EXPAND_PARAMETER = OpenApiParameter(
+    name="expand",
+    description="Comma separated related data to embed: book (book_title), user (user_email)",
+    required=False,
+    type=str,
+)
 
 
-class PaymentDetailView(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+class PaymentListView(PaymentViewMixin, ValuesListMixin, generics.ListCreateAPIView):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NewestFirstCursorPagination
+    query_budget = 1
 
-    def get_queryset(self) -> QuerySet[Payment]:
-        # Get payments only for the authenticated user, or all payments for superuser
-        if self.request.user.is_superuser:
-            return Payment.objects.all()
-        else:
-            return Payment.objects.filter(borrowing__user=self.request.user)
+    @extend_schema(parameters=[EXPAND_PARAMETER])
+    def get(self, request, *args, **kwargs) -> Response:
+        return self.list(request, *args, **kwargs)
 
 
-payment_detail_view = PaymentDetailView.as_view({"get": "retrieve"})
+class ExportView(generics.GenericAPIView):
+    """
+    Streams every row the user can see, without pagination
+    """
 
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 1
+    export_fields: List[str] = []
+    export_name = ""
 
-def initiate_payment(request, payment_id: int) -> JsonResponse:
-    payment: Payment = Payment.objects.get(pk=payment_id)
-    session_id, session_url = create_payment_session(payment)
-    payment.session_id = session_id
-    payment.session_url = session_url
-    payment.save()
-    return JsonResponse({"session_id": session_id, "session_url": session_url})
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="output",
+                description="Export format, csv (default) or ndjson",
+                required=False,
+                type=str,
+                enum=list(CONTENT_TYPES),
+            ),
+        ],
+        responses=OpenApiTypes.STR,
+    )
+    def get(self, request, *args, **kwargs):
+        output = request.query_params.get("output", "csv")
+        if output not in CONTENT_TYPES:
+            return Response(
+                {"error": f"Unknown output, choose one of {', '.join(CONTENT_TYPES)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return export_response(
+            self.get_queryset().order_by("id"),
+            self.export_fields,
+            output,
+            self.export_name,
+        )
+
+
+class BorrowingExport(ExportView):
+    export_fields = [
+        "id",
+        "book_id",
+        "book__title",
+        "user_id",
+        "borrow_date",
+        "expected_return_date",
+        "actual_return_date",
+    ]
+    export_name = "borrowings"
 
+    def get_queryset(self) -> QuerySet[Borrowing]:
+        if self.request.user.is_superuser:
+            return Borrowing.objects.all()
+        return Borrowing.objects.filter(user_id=self.request.user.id)
+
+
+class PaymentExport(ExportView):
+    export_fields = [
+        "id",
+        "borrowing_id",
+        "status",
+        "type",
+        "money_to_pay",
+        "session_id",
+        "session_created_at",
+        "session_expires_at",
+    ]
+    export_name = "payments"
 
-def payment_success(request) -> JsonResponse:
-    session_id = request.GET.get("session_id")
-    payment = Payment.objects.get(session_id=session_id)
+    def get_queryset(self) -> QuerySet[Payment]:
+        if self.request.user.is_superuser:
+            return Payment.objects.all()
+        return Payment.objects.filter(borrowing__user_id=self.request.user.id)
 
-    stripe.api_key = settings.STRIPE_SECRET_KEY
 
-    # Retrieve the Stripe Checkout Session
-    session = stripe.checkout.Session.retrieve(payment.session_id)
+class PaymentDetailView(
+    PaymentViewMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+):
+    queryset = Payment.objects.all()
+    serializer_class = PaymentSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 1
 
-    # Check if the payment is successful
-    if session.payment_status == "paid":
-        payment.status = Payment.PAID
-        payment.save()
+    @extend_schema(parameters=[EXPAND_PARAMETER])
+    def retrieve(self, request, *args, **kwargs) -> Response:
+        return super().retrieve(request, *args, **kwargs)
 
-        # Send payment data via Telegram
-        notify_successful_payment(payment)
 
-        return JsonResponse({"message": "Payment successful"})
+payment_detail_view = PaymentDetailView.as_view({"get": "retrieve"})
 
-    else:
-        payment.status = session.payment_status
-        payment.save()
 
+class PaymentSessionView(PaymentViewMixin, generics.RetrieveAPIView):
+    """
+    Polled after a return until its payment's checkout session is created,
+    answers 202 until then
+    """
 
-def payment_cancel(request) -> JsonResponse:
-    session_id = request.GET.get("session_id")
-    payment = Payment.objects.get(session_id=session_id)
+    queryset = Payment.objects.all()
+    serializer_class = PaymentSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 1
+
+    def retrieve(self, request, *args, **kwargs) -> Response:
+        payment = self.get_object()
+        serializer = self.get_serializer(payment)
+        if payment.session_url or payment.status != Payment.PENDING:
+            return Response(serializer.data)
+        return Response(
+            serializer.data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Retry-After": str(settings.PAYMENT_SESSION_POLL_INTERVAL)},
+        )
+
+
+# Loading the payment, then claiming and storing a new session
+@query_budget(3)
+async def initiate_payment(request, payment_id: int) -> JsonResponse:
+    """
+    Checkout session of a pending payment, repeated calls get the same one
+    while it's valid
+    """
+    try:
+        payment: Payment = await Payment.objects.select_related("borrowing__book").aget(
+            pk=payment_id
+        )
+    except Payment.DoesNotExist:
+        raise Http404("No Payment matches the given query.")
+    if payment.status != Payment.PENDING:
+        return JsonResponse(
+            {"error": f"Payment is {payment.status.lower()}."}, status=400
+        )
+    session_id, session_url = await acreate_payment_session(payment)
+    return JsonResponse({"session_id": session_id, "session_url": session_url})
 
-    stripe.api_key = settings.STRIPE_SECRET_KEY
 
-    # Retrieve the Stripe Checkout Session
-    session = stripe.checkout.Session.retrieve(payment.session_id)
+@csrf_exempt
+@require_POST
+@query_budget(1)
+def stripe_webhook(request) -> JsonResponse:
+    if not settings.STRIPE_WEBHOOK_SECRET:
+        return JsonResponse({"error": "Stripe webhooks are not configured"}, status=503)
+    try:
+        record_stripe_event(request.body, request.headers.get("Stripe-Signature", ""))
+    except (ValueError, stripe.error.SignatureVerificationError):
+        return JsonResponse({"error": "Invalid Stripe event"}, status=400)
+    # Events are applied to payments by the apply_pending_stripe_events task
+    return JsonResponse({"received": True})
+
+
+async def _session_payments(request) -> List[Payment]:
+    session_id = request.GET.get("session_id")
+    # Payments whose session isn't created yet have no session_id
+    if not session_id:
+        raise Http404("No Payment matches the given query.")
+    # A bulk return pays for several payments with one session
+    payments = [
+        payment async for payment in Payment.objects.filter(session_id=session_id)
+    ]
+    if not payments:
+        raise Http404("No Payment matches the given query.")
+    return payments
+
+
+@query_budget(1)
+async def payment_success(request) -> JsonResponse:
+    payments = await _session_payments(request)
+
+    # Payment status is kept up to date by Stripe webhooks
+    if all(payment.status == Payment.PAID for payment in payments):
+        return JsonResponse({"message": "Payment successful"})
+    return JsonResponse(
+        {"message": "Payment is being processed", "status": payments[0].status}
+    )
 
-    # Check if the payment is canceled
-    if session.payment_status == "canceled":
-        payment.status = Payment.CANCELED
-        payment.save()
 
-        return JsonResponse({"message": "Payment cancelled"})
+@query_budget(1)
+async def payment_cancel(request) -> JsonResponse:
+    payments = await _session_payments(request)
 
-    else:
-        payment.status = session.payment_status
-        payment.save()
+    # The session stays open until it expires, so the payment can still be made
+    return JsonResponse({"message": "Payment cancelled", "status": payments[0].status})
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Tuple, Union
+
+from django.conf import settings
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.models import TokenUser
+
+from customer.models import User
+
+
+class UserCache:
+    """
+    Per-process LRU cache of users, entries expire after `ttl` seconds
+    """
+
+    def __init__(self) -> None:
+        self._users: "OrderedDict[int, Tuple[float, User]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> User:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry and entry[0] > now:
+                self._users.move_to_end(user_id)
+                return entry[1]
+
+        user = User.objects.get(pk=user_id)
+        with self._lock:
+            self._users[user_id] = (now + settings.USER_CACHE_TTL, user)
+            self._users.move_to_end(user_id)
+            while len(self._users) > settings.USER_CACHE_SIZE:
+                self._users.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+
+
+user_cache = UserCache()
+
+
+class ClaimsUser(TokenUser):
+    """
+    Request user built from the access token claims, without a query.
+    The full User is loaded through the user cache only when needed,
+    e.g. for tokens issued before the claims were added.
+    """
+
+    @cached_property
+    def user(self) -> User:
+        return user_cache.get(self.id)
+
+    def _claim(self, name: str):
+        if name in self.token:
+            return self.token[name]
+        return getattr(self.user, name)
+
+    @cached_property
+    def is_staff(self) -> bool:
+        return self._claim("is_staff")
+
+    @cached_property
+    def is_superuser(self) -> bool:
+        return self._claim("is_superuser")
+
+    @cached_property
+    def email(self) -> str:
+        return self._claim("email")
+
+
+def get_full_user(user: Union[User, ClaimsUser]) -> User:
+    """
+    User model instance for the request user, e.g. to assign to a FK
+    """
+    if isinstance(user, ClaimsUser):
+        return user.user
+    return user
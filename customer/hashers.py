@@ -0,0 +1,73 @@
+import base64
+import hashlib
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.auth.hashers import ScryptPasswordHasher
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def hashing_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Process pool shared by the web worker's threads,
+    None when PASSWORD_HASHING_WORKERS is 0
+    """
+    global _pool
+    if not settings.PASSWORD_HASHING_WORKERS:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # Don't fork a process that may be running request threads
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASHING_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+    return _pool
+
+
+def discard_hashing_pool(pool: ProcessPoolExecutor) -> None:
+    """
+    Drop a broken pool, e.g. after one of its processes was killed,
+    so the next hash starts a new one
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+class PooledScryptPasswordHasher(ScryptPasswordHasher):
+    """
+    Django's scrypt hasher computing the hash in the hashing pool,
+    hashes are interchangeable with ScryptPasswordHasher ones
+    """
+
+    def encode(self, password, salt, n=None, r=None, p=None):
+        self._check_encode_args(password, salt)
+        n = n or self.work_factor
+        r = r or self.block_size
+        p = p or self.parallelism
+        args = (password.encode(),)
+        kwargs = dict(salt=salt.encode(), n=n, r=r, p=p, maxmem=self.maxmem, dklen=64)
+        pool = hashing_pool()
+        hash_ = None
+        if pool is not None:
+            try:
+                hash_ = pool.submit(hashlib.scrypt, *args, **kwargs).result()
+            except BrokenProcessPool:
+                logger.warning("Password hashing pool is broken, restarting it")
+                discard_hashing_pool(pool)
+        if hash_ is None:
+            hash_ = hashlib.scrypt(*args, **kwargs)
+        hash_ = base64.b64encode(hash_).decode("ascii").strip()
+        return "%s$%d$%s$%d$%d$%s" % (self.algorithm, n, salt, r, p, hash_)
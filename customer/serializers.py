@@ -1,5 +1,12 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 
 from customer.models import User
 
@@ -24,3 +31,43 @@ class UserSerializer(serializers.ModelSerializer):
             user.save()
 
         return user
+
+
+def set_user_claims(token: RefreshToken, user: User) -> None:
+    token["email"] = user.email
+    token["is_staff"] = user.is_staff
+    token["is_superuser"] = user.is_superuser
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Tokens carry the claims API views check, so requests can be
+    authenticated without loading the user
+    """
+
+    @classmethod
+    def get_token(cls, user: User) -> RefreshToken:
+        token = super().get_token(user)
+        set_user_claims(token, user)
+        return token
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Access tokens are refreshed with the user's current claims, users
+    that were deactivated or deleted get none. With short-lived access
+    tokens, this bounds how long a revoked role keeps working.
+    """
+
+    def validate(self, attrs: dict) -> dict:
+        refresh = self.token_class(attrs["refresh"])
+        user = User.objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]},
+            is_active=True,
+        ).first()
+        if user is None:
+            raise AuthenticationFailed(
+                "User is inactive or doesn't exist.", code="user_inactive"
+            )
+        set_user_claims(refresh, user)
+        return super().validate({**attrs, "refresh": str(refresh)})
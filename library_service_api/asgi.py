@@ -2,6 +2,8 @@
 ASGI config for library_service_api project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with uvicorn, see the web-asgi service in docker-compose.yml.
+Async views wait for Stripe without holding a thread.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
@@ -9,8 +11,14 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library_service_api.settings")
 
-application = get_asgi_application()
+# Like django.core.asgi.get_asgi_application, with a handler that streams
+# exports outside the event loop
+django.setup(set_prefix=False)
+
+from library_service_api.handlers import StreamingASGIHandler  # noqa: E402
+
+application = StreamingASGIHandler()
@@ -16,6 +16,9 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 
+# Task duration metrics, served by the worker on CELERY_METRICS_PORT
+import library_service_api.metrics  # noqa: E402,F401
+
 
 @app.task(bind=True)
 def debug_task(self):
@@ -0,0 +1,36 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    Django 4.1 iterates streaming responses inside the event loop, where
+    generators reading querysets, like the exports, can't query the
+    database. Their parts are read in the request's sync thread instead,
+    the thread its sync views ran in.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        parts = iter(response)
+        # The parent sends the headers and the closing message, the body
+        # goes in between. Closing the response still closes `parts`.
+        response.streaming_content = []
+        next_part = sync_to_async(next, thread_sensitive=True)
+
+        async def send_body_before_closing(message: dict) -> None:
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                while (part := await next_part(parts, None)) is not None:
+                    for chunk, _ in self.chunk_bytes(part):
+                        await send(
+                            {
+                                "type": "http.response.body",
+                                "body": chunk,
+                                "more_body": True,
+                            }
+                        )
+            await send(message)
+
+        await super().send_response(response, send_body_before_closing)
@@ -0,0 +1,243 @@
+"""
+Prometheus metrics of the API, its database queries, external calls
+and Celery tasks.
+
+Web processes expose them at /metrics/, Celery workers on
+CELERY_METRICS_PORT. PROMETHEUS_MULTIPROC_DIR must point to a directory
+emptied at start when a server runs several processes (uvicorn workers,
+the runserver reloader, the prefork pool), so each of them reports the
+metrics of all. The Celery worker needs it in any case: its metrics
+endpoint runs in the main process, the tasks in the pool's children.
+"""
+import abc
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+
+from celery.signals import (
+    task_postrun,
+    task_prerun,
+    worker_process_shutdown,
+    worker_ready,
+)
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+
+logger = logging.getLogger(__name__)
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time to respond to a request, by URL name",
+    ["view", "method", "status"],
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries run for a request",
+    ["view"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds",
+    "Time spent in database queries for a request",
+    ["view"],
+)
+EXTERNAL_CALL_SECONDS = Histogram(
+    "external_call_duration_seconds",
+    "Time of calls to Stripe and Telegram, by outcome",
+    ["service", "operation", "outcome"],
+)
+TASK_SECONDS = Histogram(
+    "celery_task_duration_seconds",
+    "Time to run a Celery task, by its final state",
+    ["task", "state"],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600),
+)
+
+
+class QueryStats:
+    """
+    Database queries of a request, with their SQL and time
+    when the query profiler keeps them
+    """
+
+    __slots__ = ("count", "seconds", "queries")
+
+    def __init__(self, keep_sql: bool = False) -> None:
+        self.count = 0
+        self.seconds = 0.0
+        self.queries: Optional[List[Tuple[str, float]]] = [] if keep_sql else None
+
+
+# Queries of the current request, shared with the threads
+# its async views run their queries in
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _query_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats.count += 1
+        stats.seconds += elapsed
+        if stats.queries is not None:
+            stats.queries.append((sql, elapsed))
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs) -> None:
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+@contextmanager
+def recording_queries() -> Iterator[QueryStats]:
+    stats = _query_stats.get()
+    if stats is not None:
+        # Already recorded by an outer middleware
+        yield stats
+        return
+    stats = QueryStats(keep_sql=settings.QUERY_PROFILER)
+    token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+
+
+@contextmanager
+def observe_external_call(service: str, operation: str) -> Iterator[None]:
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        EXTERNAL_CALL_SECONDS.labels(service, operation, outcome).observe(
+            time.perf_counter() - started
+        )
+
+
+class QueryStatsMiddleware(abc.ABC):
+    """
+    Base of the middleware reading the database queries of every request,
+    which share one recording of them
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks the middleware as async, like Django's MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self._acall(request)
+        started = time.perf_counter()
+        with recording_queries() as stats:
+            response = self.get_response(request)
+        self.process_queries(request, response, time.perf_counter() - started, stats)
+        return response
+
+    async def _acall(self, request):
+        started = time.perf_counter()
+        with recording_queries() as stats:
+            response = await self.get_response(request)
+        self.process_queries(request, response, time.perf_counter() - started, stats)
+        return response
+
+    @abc.abstractmethod
+    def process_queries(
+        self, request, response, seconds: float, stats: QueryStats
+    ) -> None:
+        """
+        Called with the response, the time taken to produce it
+        and the queries run meanwhile
+        """
+
+
+class MetricsMiddleware(QueryStatsMiddleware):
+    """
+    Observes latency, status and database queries of every request,
+    labelled by the name of the matched URL
+    """
+
+    def process_queries(
+        self, request, response, seconds: float, stats: QueryStats
+    ) -> None:
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        REQUEST_SECONDS.labels(view, request.method, response.status_code).observe(
+            seconds
+        )
+        REQUEST_DB_QUERIES.labels(view).observe(stats.count)
+        REQUEST_DB_SECONDS.labels(view).observe(stats.seconds)
+
+
+def _registry() -> CollectorRegistry:
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request) -> HttpResponse:
+    return HttpResponse(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+_task_started = {}
+
+
+@task_prerun.connect
+def _start_task_timer(task_id: str, **kwargs) -> None:
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def _observe_task(task_id: str, task, state: str = None, **kwargs) -> None:
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_SECONDS.labels(task.name, state or "UNKNOWN").observe(
+            time.perf_counter() - started
+        )
+
+
+@worker_ready.connect
+def _serve_worker_metrics(**kwargs) -> None:
+    if not settings.CELERY_METRICS_PORT:
+        return
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        logger.warning(
+            "PROMETHEUS_MULTIPROC_DIR isn't set, metrics of tasks run "
+            "in pool processes won't be served"
+        )
+    start_http_server(settings.CELERY_METRICS_PORT, registry=_registry())
+
+
+@worker_process_shutdown.connect
+def _forget_pool_process(pid: int, **kwargs) -> None:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,117 @@
+"""
+Opt-in SQL profiler, enabled with QUERY_PROFILER.
+
+Every request gets a Server-Timing header with its query count and
+database time. Requests slower than QUERY_PROFILER_SLOW_MS are kept,
+with their repeated SQL, in a per-process ring buffer that admins
+read at /profiler/slow-requests/. Queries are recorded by
+library_service_api.metrics, which keeps their SQL while profiling.
+"""
+import logging
+import re
+import threading
+from collections import Counter, deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from library_service_api.metrics import QueryStats, QueryStatsMiddleware
+
+logger = logging.getLogger(__name__)
+
+# Lists of placeholders, e.g. of pk__in lookups, vary with their values
+_PLACEHOLDER_LIST = re.compile(r"\((?:%s|\?)(?:, (?:%s|\?))*\)")
+
+
+def sql_shape(sql: str) -> str:
+    return _PLACEHOLDER_LIST.sub("(...)", sql)
+
+
+def duplicate_queries(stats: QueryStats) -> List[Tuple[str, int]]:
+    shapes = Counter(sql_shape(sql) for sql, _ in stats.queries)
+    return [(shape, count) for shape, count in shapes.most_common() if count > 1]
+
+
+_slow_requests: Deque[Dict] = deque(maxlen=settings.QUERY_PROFILER_SAMPLES)
+_slow_requests_lock = threading.Lock()
+
+
+def query_budget(queries: int) -> Callable:
+    """
+    Declare the most queries a function view may run,
+    class-based views set a `query_budget` attribute instead
+    """
+
+    def decorator(view: Callable) -> Callable:
+        view.query_budget = queries
+        return view
+
+    return decorator
+
+
+def get_query_budget(view: Callable) -> Optional[int]:
+    view_class = getattr(view, "cls", None) or getattr(view, "view_class", None)
+    return getattr(view_class or view, "query_budget", None)
+
+
+def slow_requests() -> List[Dict]:
+    with _slow_requests_lock:
+        return list(reversed(_slow_requests))
+
+
+class QueryProfilerMiddleware(QueryStatsMiddleware):
+    """
+    Profiles the queries of every request when QUERY_PROFILER is on,
+    does nothing otherwise
+    """
+
+    def process_queries(
+        self, request, response, seconds: float, stats: QueryStats
+    ) -> None:
+        # Requests started before the profiler was turned on kept no SQL
+        if not settings.QUERY_PROFILER or stats.queries is None:
+            return
+        db_ms = stats.seconds * 1000
+        response["Server-Timing"] = (
+            f'db;dur={db_ms:.1f};desc="{stats.count} queries", '
+            f"total;dur={seconds * 1000:.1f}"
+        )
+        match = request.resolver_match
+        budget = get_query_budget(match.func) if match else None
+        if budget is not None and stats.count > budget:
+            logger.warning(
+                "%s ran %d queries, over its budget of %d",
+                match.view_name,
+                stats.count,
+                budget,
+            )
+        if seconds * 1000 < settings.QUERY_PROFILER_SLOW_MS:
+            return
+        sample = {
+            "at": timezone.now(),
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "duration_ms": round(seconds * 1000, 1),
+            "db_ms": round(db_ms, 1),
+            "queries": stats.count,
+            "query_budget": budget,
+            "duplicates": [
+                {"sql": shape, "count": count}
+                for shape, count in duplicate_queries(stats)
+            ],
+        }
+        with _slow_requests_lock:
+            _slow_requests.append(sample)
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def slow_requests_view(request: Request) -> Response:
+    return Response(slow_requests())
@@ -49,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "library_service_api.metrics.MetricsMiddleware",
+    "library_service_api.profiling.QueryProfilerMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -112,6 +114,19 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# The first hasher hashes new passwords, older hashes are
+# upgraded to it when their user logs in
+PASSWORD_HASHERS = [
+    "customer.hashers.PooledScryptPasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+]
+
+# Processes hashing passwords next to each web worker, 0 hashes in the request thread
+PASSWORD_HASHING_WORKERS = int(os.getenv("PASSWORD_HASHING_WORKERS", 2))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.1/topics/i18n/
@@ -145,7 +160,7 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_THROTTLE_RATES": {"anon": "10000/day", "user": "10000/day"},
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "rest_framework_simplejwt.authentication.JWTStatelessUserAuthentication",
     ),
 }
 
@@ -163,20 +178,111 @@ SPECTACULAR_SETTINGS = {
 }
 
 SIMPLE_JWT = {
-    "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60 * 60),
+    # Access tokens aren't checked against the database, a deactivated
+    # user or a revoked role keeps working until the token expires
+    "ACCESS_TOKEN_LIFETIME": timedelta(minutes=5),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
     "ROTATE_REFRESH_TOKENS": False,
+    "TOKEN_OBTAIN_SERIALIZER": "customer.serializers.ClaimsTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "customer.serializers.ClaimsTokenRefreshSerializer",
+    # Request users are built from the token claims, see customer/authentication.py
+    "TOKEN_USER_CLASS": "customer.authentication.ClaimsUser",
 }
 
+# SQL profiler, see library_service_api/profiling.py
+QUERY_PROFILER = os.getenv("QUERY_PROFILER", "") == "1"
+QUERY_PROFILER_SLOW_MS = 200
+QUERY_PROFILER_SAMPLES = 100
+
+# Per-process cache of users loaded for stateless token users
+USER_CACHE_SIZE = 1024
+USER_CACHE_TTL = 60
+
 FINE_MULTIPLIER = 2
 
 CONCURRENT_REQUESTS = 5
 
+# Outbound HTTP to Stripe and Telegram, see book/http_clients.py
+HTTP_POOL_SIZE = 10
+HTTP_RETRIES = 2
+HTTP_RETRY_BACKOFF = 0.5
+# Failures in a row that stop calls to an upstream, and seconds until it's tried again
+CIRCUIT_BREAKER_FAILURES = 5
+CIRCUIT_BREAKER_RESET_TIMEOUT = 30
+
+# Rows each maintained counter is spread over, see book/counters.py
+COUNTER_SHARDS = 8
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Versioned read-through cache for the book catalog, see book/cache.py
+    "catalog": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": f"{REDIS_URL}/1",
+        "TIMEOUT": 15 * 60,
+        "OPTIONS": {"socket_connect_timeout": 1, "socket_timeout": 1},
+    },
+}
+
 CELERY_BROKER_URL = "redis://redis:6379"
+# Port of the Prometheus endpoint of Celery workers, 0 disables it
+CELERY_METRICS_PORT = int(os.getenv("CELERY_METRICS_PORT", 9808))
 CELERY_RESULT_BACKEND = "redis://redis:6379"
+CELERY_BEAT_SCHEDULE = {
+    "send-pending-telegram-messages": {
+        "task": "book.tasks.send_pending_telegram_messages",
+        "schedule": 5.0,
+    },
+    "apply-stripe-events": {
+        "task": "book.tasks.apply_pending_stripe_events",
+        "schedule": 5.0,
+    },
+    "check-expired-sessions": {
+        "task": "book.tasks.check_expired_sessions",
+        # Well within STRIPE_EXPIRY_GRACE, so every session is checked with
+        # Stripe before it would be expired without asking
+        "schedule": 60.0,
+    },
+    "create-missing-checkout-sessions": {
+        "task": "book.tasks.create_missing_checkout_sessions",
+        "schedule": 5 * 60.0,
+    },
+}
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_REQUEST_TIMEOUT = 10
+TELEGRAM_MESSAGE_LIMIT = 4096
+# Telegram allows about one message per second to the same chat
+TELEGRAM_MESSAGES_PER_SECOND = 1
+TELEGRAM_OUTBOX_BATCH_SIZE = 100
+TELEGRAM_CLAIM_TIMEOUT = 5 * 60
+TELEGRAM_MAX_ATTEMPTS = 8
+TELEGRAM_RETRY_BACKOFF = 5
 
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY")
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+STRIPE_REQUEST_TIMEOUT = 10
+STRIPE_EVENTS_BATCH_SIZE = 500
+STRIPE_SESSION_LIFETIME = 30 * 60
+# Sessions expiring sooner than this aren't handed out again
+STRIPE_SESSION_REUSE_MARGIN = 60
+# Seconds a caller has to create the session it claimed on payments,
+# before other callers claim a new one
+STRIPE_SESSION_CLAIM_TIMEOUT = 60
+# Seconds clients wait between polls for a payment's checkout session
+PAYMENT_SESSION_POLL_INTERVAL = 2
+# Retries of session creation, with jittered backoff over up to 4 minutes
+PAYMENT_SESSION_TASK_RETRIES = 8
+# Payments still without a session this many seconds after their
+# creation are queued again
+PAYMENT_SESSION_RECOVERY_DELAY = 10 * 60
+# Sessions this long past their deadline are expired without asking Stripe,
+# check_expired_sessions has to run more often than that
+STRIPE_EXPIRY_GRACE = 10 * 60
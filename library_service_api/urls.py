@@ -18,10 +18,15 @@ from django.urls import path, include
 
 from drf_spectacular.views import SpectacularSwaggerView, SpectacularAPIView
 
+from library_service_api.metrics import metrics_view
+from library_service_api.profiling import slow_requests_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("users/", include("customer.urls", namespace="customer")),
     path("", include("book.urls", namespace="book")),
+    path("metrics/", metrics_view, name="metrics"),
+    path("profiler/slow-requests/", slow_requests_view, name="profiler-slow-requests"),
     path("doc/", SpectacularAPIView.as_view(), name="schema"),
     # Optional UI:
     path(
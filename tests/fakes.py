@@ -0,0 +1,209 @@
+import abc
+import hashlib
+import hmac
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import contextmanager
+from email.message import Message
+from typing import Dict, Iterator, List, Optional, Tuple
+from unittest.mock import patch
+from urllib.parse import parse_qs
+
+from django.test import override_settings
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for bursts of concurrent connections from benchmarks
+    request_queue_size = 128
+
+
+class FakeServer(abc.ABC):
+    """
+    Local HTTP server standing in for an external API in tests and benchmarks
+    """
+
+    def __init__(self) -> None:
+        self._server: Optional[_HTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    @abc.abstractmethod
+    def handle(
+        self, method: str, path: str, body: bytes, headers: Message
+    ) -> Tuple[int, dict]:
+        """
+        Status and JSON body answering a request
+        """
+
+    def _handler(self) -> type:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so clients can reuse their connections
+            protocol_version = "HTTP/1.1"
+
+            def _respond(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                status, body = fake.handle(
+                    self.command, self.path, self.rfile.read(length), self.headers
+                )
+                content = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = do_POST = _respond
+
+            def log_message(self, *args) -> None:
+                pass
+
+        return Handler
+
+    def __enter__(self) -> "FakeServer":
+        self._server = _HTTPServer(("127.0.0.1", 0), self._handler())
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FakeTelegramServer(FakeServer):
+    """
+    Stand-in for api.telegram.org that records sent messages.
+
+    Queued responses are returned first, e.g. to simulate rate limiting:
+
+        with FakeTelegramServer() as server:
+            server.responses.append((429, {"ok": False, "error_code": 429}))
+            with override_settings(TELEGRAM_API_URL=server.url):
+                ...
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.messages: List[str] = []
+        self.responses: List[Tuple[int, dict]] = []
+
+    def handle(
+        self, method: str, path: str, body: bytes, headers: Message
+    ) -> Tuple[int, dict]:
+        if self.responses:
+            return self.responses.pop(0)
+        self.messages.append(json.loads(body or b"{}").get("text", ""))
+        return 200, {"ok": True, "result": {}}
+
+
+class FakeStripeServer(FakeServer):
+    """
+    Stand-in for api.stripe.com serving Checkout sessions from `sessions`,
+    point stripe.api_base at `url` to use it.
+    Unknown sessions are reported as still open, created ones are added.
+    Creations repeating an Idempotency-Key get the first one's answer.
+    """
+
+    session_path = re.compile(r"^/v1/checkout/sessions/(?P<id>[^/?]+)")
+
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__()
+        self.latency = latency
+        self.sessions: Dict[str, dict] = {}
+        self.requests: List[str] = []
+        self.idempotent_requests: Dict[str, Tuple[dict, dict]] = {}
+        self._lock = threading.Lock()
+
+    def handle(
+        self, method: str, path: str, body: bytes, headers: Message
+    ) -> Tuple[int, dict]:
+        with self._lock:
+            self.requests.append(f"{method} {path}")
+        time.sleep(self.latency)
+        if method == "POST" and path == "/v1/checkout/sessions":
+            return self.create_session(
+                parse_qs(body.decode()), headers.get("Idempotency-Key")
+            )
+        match = self.session_path.match(path)
+        if method != "GET" or not match:
+            return 404, {"error": {"message": "Unknown request", "type": "invalid"}}
+        session_id = match.group("id")
+        created = int(time.time())
+        return 200, {
+            "id": session_id,
+            "object": "checkout.session",
+            "status": "open",
+            "payment_status": "unpaid",
+            "created": created,
+            "expires_at": created + 30 * 60,
+            **self.sessions.get(session_id, {}),
+        }
+
+    @contextmanager
+    def serving_stripe(self) -> Iterator["FakeStripeServer"]:
+        """
+        Point the stripe library at this server, with a test key
+        """
+        with patch("stripe.api_base", self.url), override_settings(
+            STRIPE_SECRET_KEY="sk_test_fake"
+        ):
+            yield self
+
+    def create_session(self, params: dict, key: Optional[str]) -> Tuple[int, dict]:
+        with self._lock:
+            if key in self.idempotent_requests:
+                first_params, session = self.idempotent_requests[key]
+                if params != first_params:
+                    error = {
+                        "message": "Different parameters",
+                        "type": "idempotency_error",
+                    }
+                    return 400, {"error": error}
+                return 200, session
+            session_id = f"cs_fake_{len(self.sessions)}"
+            created = int(time.time())
+            self.sessions[session_id] = {
+                "url": f"{self.url}/pay/{session_id}",
+                "created": created,
+                "expires_at": created + 30 * 60,
+            }
+            session = {
+                "id": session_id,
+                "object": "checkout.session",
+                "status": "open",
+                "payment_status": "unpaid",
+                **self.sessions[session_id],
+            }
+            if key is not None:
+                self.idempotent_requests[key] = (params, session)
+        return 200, session
+
+
+def signed_stripe_event(
+    event_type: str, session: dict, secret: str, event_id: str = None
+) -> Tuple[bytes, str]:
+    """
+    Build a webhook request body for a checkout session event and
+    the Stripe-Signature header signing it with the given secret
+    """
+    payload = json.dumps(
+        {
+            "id": event_id or f"evt_{session['id']}_{event_type}",
+            "object": "event",
+            "type": event_type,
+            "data": {"object": {"object": "checkout.session", **session}},
+        }
+    )
+    timestamp = int(time.time())
+    signature = hmac.new(
+        secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+    ).hexdigest()
+    return payload.encode(), f"t={timestamp},v1={signature}"
@@ -0,0 +1,55 @@
+from datetime import date, timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from book.admin import EstimatedCountPaginator
+from book.models import Book, Borrowing, Payment
+from customer.models import User
+
+
+class AdminChangelistTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            email="admin@example.com", password="password"
+        )
+        self.client.force_login(self.admin)
+
+    def create_payments(self, count: int) -> None:
+        today = date.today()
+        for i in range(count):
+            user = User.objects.create_user(
+                email=f"user{User.objects.count()}@example.com", password="password"
+            )
+            book = Book.objects.create(
+                title=f"Book {i}", author="Test Author", cover="Soft", daily_fee=1
+            )
+            borrowing = Borrowing.objects.create(
+                book=book,
+                user=user,
+                borrow_date=today,
+                expected_return_date=today + timedelta(days=7),
+            )
+            Payment.objects.create(borrowing=borrowing, money_to_pay=1)
+
+    def count_queries(self, url: str) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_query_count_constant(self):
+        for name in ("book_payment_changelist", "book_borrowing_changelist"):
+            url = reverse(f"admin:{name}")
+            self.create_payments(2)
+            few_rows = self.count_queries(url)
+            self.create_payments(10)
+            self.assertEqual(self.count_queries(url), few_rows, name)
+
+    def test_estimated_paginator_counts_small_tables_exactly(self):
+        self.create_payments(3)
+        paginator = EstimatedCountPaginator(Payment.objects.order_by("id"), 2)
+        self.assertEqual(paginator.count, 3)
+        self.assertEqual(paginator.num_pages, 2)
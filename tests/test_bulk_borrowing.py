@@ -0,0 +1,201 @@
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from book.models import Book, Borrowing, Payment
+from book.tasks import create_batch_checkout_session
+from customer.models import User
+
+
+def create_books(count: int, inventory: int = 1) -> list:
+    return [
+        Book.objects.create(
+            title=f"Book {i}",
+            author="Test Author",
+            cover="Soft",
+            daily_fee=1.50,
+            inventory=inventory,
+        )
+        for i in range(count)
+    ]
+
+
+@patch("book.views.notify_bulk_borrowing_created")
+class BulkBorrowingCreateTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test_user@example.com", password="password"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("book:borrowing-bulk-create")
+
+    def borrow(self, books: list):
+        return self.client.post(
+            self.url,
+            {
+                "books": [book.id for book in books],
+                "borrow_date": "2023-02-26",
+                "expected_return_date": "2023-03-05",
+            },
+            format="json",
+        )
+
+    def test_bulk_borrowing(self, mock_notify):
+        books = create_books(3)
+        response = self.borrow(books)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(Borrowing.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(
+            list(Book.objects.values_list("inventory", flat=True)), [0, 0, 0]
+        )
+        mock_notify.assert_called_once()
+
+    def test_bulk_borrowing_same_book_twice(self, mock_notify):
+        book = create_books(1, inventory=2)[0]
+        response = self.borrow([book, book])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 0)
+
+    def test_bulk_borrowing_is_all_or_nothing(self, mock_notify):
+        books = create_books(3)
+        Book.objects.filter(pk=books[1].pk).update(inventory=0)
+        response = self.borrow(books)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Borrowing.objects.exists())
+        self.assertEqual(
+            list(Book.objects.order_by("id").values_list("inventory", flat=True)),
+            [1, 0, 1],
+        )
+        mock_notify.assert_not_called()
+
+    def test_bulk_borrowing_unknown_book(self, mock_notify):
+        response = self.client.post(
+            self.url,
+            {
+                "books": [9999],
+                "borrow_date": "2023-02-26",
+                "expected_return_date": "2023-03-05",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count_does_not_grow_with_cart(self, mock_notify):
+        small_cart_books = create_books(2)
+        large_cart_books = create_books(20)
+        # The first borrowing of the year creates its counter
+        self.borrow(create_books(1))
+        with CaptureQueriesContext(connection) as small_cart:
+            self.borrow(small_cart_books)
+        with CaptureQueriesContext(connection) as large_cart:
+            self.borrow(large_cart_books)
+        self.assertEqual(len(small_cart), len(large_cart))
+
+
+@patch("stripe.checkout.Session.create")
+class BulkBorrowingReturnTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test_user@example.com", password="password"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("book:borrowing-bulk-return")
+        today = timezone.now().date()
+        self.borrowings = [
+            Borrowing.objects.create(
+                book=book,
+                user=self.user,
+                borrow_date=today - timedelta(days=7),
+                expected_return_date=today,
+            )
+            for book in create_books(3, inventory=0)
+        ]
+
+    def mock_session(self, mock_create: MagicMock) -> None:
+        mock_session = MagicMock()
+        mock_session.id = "session_id"
+        mock_session.url = "session_url"
+        mock_create.return_value = mock_session
+
+    @override_settings(STRIPE_SECRET_KEY="sk_test_fake")
+    def test_bulk_return(self, mock_create):
+        self.mock_session(mock_create)
+        # The shared session is created by a task once the return commits
+        with patch.object(
+            create_batch_checkout_session,
+            "delay",
+            side_effect=create_batch_checkout_session,
+        ), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                self.url,
+                {"borrowings": [borrowing.id for borrowing in self.borrowings]},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["payments"]), len(self.borrowings))
+        response = self.client.get(response.data["payment_session_url"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["session_url"], "session_url")
+        self.assertFalse(
+            Borrowing.objects.filter(actual_return_date__isnull=True).exists()
+        )
+        self.assertEqual(
+            list(Book.objects.values_list("inventory", flat=True)), [1, 1, 1]
+        )
+        self.assertEqual(
+            Payment.objects.filter(session_id="session_id").count(),
+            len(self.borrowings),
+        )
+        # Recovered as one batch if the task is lost
+        batch_ids = set(Payment.objects.values_list("batch_id", flat=True))
+        self.assertEqual(len(batch_ids), 1)
+        self.assertIsNotNone(batch_ids.pop())
+        mock_create.assert_called_once()
+        self.assertEqual(len(mock_create.call_args.kwargs["line_items"]), 3)
+
+    def test_bulk_return_already_returned(self, mock_create):
+        self.mock_session(mock_create)
+        Borrowing.objects.filter(pk=self.borrowings[0].pk).update(
+            actual_return_date=timezone.now().date()
+        )
+        response = self.client.post(
+            self.url,
+            {"borrowings": [borrowing.id for borrowing in self.borrowings]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Payment.objects.exists())
+        mock_create.assert_not_called()
+
+    def test_bulk_return_other_users_borrowing(self, mock_create):
+        other_user = User.objects.create_user(
+            email="other_user@example.com", password="password"
+        )
+        self.client.force_authenticate(user=other_user)
+        response = self.client.post(
+            self.url, {"borrowings": [self.borrowings[0].id]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_return_staff_cannot_return_other_users_borrowing(self, mock_create):
+        staff_user = User.objects.create_user(
+            email="staff_user@example.com", password="password", is_staff=True
+        )
+        self.client.force_authenticate(user=staff_user)
+        response = self.client.post(
+            self.url, {"borrowings": [self.borrowings[0].id]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Payment.objects.exists())
+        mock_create.assert_not_called()
@@ -0,0 +1,97 @@
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import serializers, status
+from rest_framework.test import APIClient
+
+from book.counters import (
+    BOOKS_COUNTER,
+    borrowings_counter,
+    get_counter,
+    increment_counter,
+)
+from book.models import Book, Borrowing, Counter
+from book.serializers import validate_borrowing_limit
+from customer.models import User
+
+
+class CounterTest(TestCase):
+    def test_increments_spread_over_shards(self):
+        with override_settings(COUNTER_SHARDS=4):
+            for _ in range(40):
+                increment_counter("test")
+            increment_counter("test", -5)
+        self.assertEqual(get_counter("test"), 35)
+        self.assertEqual(Counter.objects.filter(name="test").count(), 4)
+        self.assertEqual(get_counter("unknown"), 0)
+
+
+class MaintainedCountersTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test_user@example.com", password="password"
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover="Soft",
+            daily_fee=1.50,
+            inventory=10,
+        )
+        self.today = date.today()
+
+    def create_borrowing(self, borrow_date) -> Borrowing:
+        return Borrowing.objects.create(
+            book=self.book,
+            user=self.user,
+            borrow_date=borrow_date,
+            expected_return_date=self.today + timedelta(days=7),
+        )
+
+    def test_books_counted(self):
+        self.assertEqual(get_counter(BOOKS_COUNTER), 1)
+        self.book.title = "Renamed"
+        self.book.save()
+        self.assertEqual(get_counter(BOOKS_COUNTER), 1)
+        self.book.delete()
+        self.assertEqual(get_counter(BOOKS_COUNTER), 0)
+
+    def test_borrowings_counted_by_year(self):
+        borrowing = self.create_borrowing(self.today)
+        self.create_borrowing("2020-05-01")
+        self.assertEqual(get_counter(borrowings_counter(self.today.year)), 1)
+        self.assertEqual(get_counter(borrowings_counter(2020)), 1)
+
+        borrowing.borrow_date = date(2020, 6, 1)
+        borrowing.save()
+        self.assertEqual(get_counter(borrowings_counter(self.today.year)), 0)
+        self.assertEqual(get_counter(borrowings_counter(2020)), 2)
+
+        borrowing.delete()
+        self.assertEqual(get_counter(borrowings_counter(2020)), 1)
+
+    @patch("book.views.notify_bulk_borrowing_created")
+    def test_bulk_borrowings_counted(self, mock_notify):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.post(
+            reverse("book:borrowing-bulk-create"),
+            {
+                "books": [self.book.id, self.book.id],
+                "borrow_date": self.today,
+                "expected_return_date": self.today + timedelta(days=7),
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(get_counter(borrowings_counter(self.today.year)), 2)
+
+    def test_limit_checked_without_counting_rows(self):
+        self.create_borrowing(self.today)
+        with patch("book.serializers.MAX_BORROWINGS_PER_YEAR", 2):
+            with self.assertNumQueries(1):
+                validate_borrowing_limit()
+            with self.assertRaises(serializers.ValidationError):
+                validate_borrowing_limit(new_borrowings=2)
@@ -0,0 +1,88 @@
+import csv
+import json
+from datetime import date, timedelta
+
+import httpx
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from book.models import Book, Borrowing, Payment
+from customer.models import User
+from library_service_api.handlers import StreamingASGIHandler
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test_user@example.com", password="password"
+        )
+        self.other_user = User.objects.create_user(
+            email="other_user@example.com", password="password"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        book = Book.objects.create(
+            title="Test, Book", author="Test Author", cover="Soft", daily_fee=1
+        )
+        today = date.today()
+        for user in (self.user, self.user, self.other_user):
+            borrowing = Borrowing.objects.create(
+                book=book,
+                user=user,
+                borrow_date=today,
+                expected_return_date=today + timedelta(days=7),
+            )
+            Payment.objects.create(borrowing=borrowing, money_to_pay="12.50")
+
+    def export(self, name: str, **params) -> list:
+        response = self.client.get(reverse(f"book:{name}-export"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode().splitlines()
+
+    def test_borrowings_csv(self):
+        rows = list(csv.DictReader(self.export("borrowing")))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]["book__title"], "Test, Book")
+        self.assertEqual(rows[0]["actual_return_date"], "")
+        self.assertEqual(
+            [int(row["id"]) for row in rows],
+            list(
+                Borrowing.objects.filter(user=self.user)
+                .order_by("id")
+                .values_list("id", flat=True)
+            ),
+        )
+
+    def test_payments_ndjson(self):
+        rows = [json.loads(line) for line in self.export("payment", output="ndjson")]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]["money_to_pay"], "12.50")
+        self.assertEqual(rows[0]["status"], Payment.PENDING)
+
+    def test_superuser_exports_everything(self):
+        self.user.is_superuser = True
+        self.user.save()
+        self.assertEqual(len(self.export("payment")), 4)
+
+    def test_unknown_output(self):
+        response = self.client.get(reverse("book:payment-export"), {"output": "xlsx"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_over_asgi(self):
+        async def export() -> httpx.Response:
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=StreamingASGIHandler()),
+                base_url="http://testserver",
+                headers={"Authorization": f"Bearer {AccessToken.for_user(self.user)}"},
+            ) as client:
+                return await client.get(reverse("book:payment-export"))
+
+        response = async_to_sync(export)()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = list(csv.DictReader(response.text.splitlines()))
+        self.assertEqual(len(rows), 2)
@@ -0,0 +1,61 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+from django.contrib.auth.hashers import ScryptPasswordHasher, make_password
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from customer.hashers import PooledScryptPasswordHasher, hashing_pool
+from customer.models import User
+
+
+class PooledScryptPasswordHasherTest(TestCase):
+    def test_same_hash_as_scrypt(self):
+        expected = ScryptPasswordHasher().encode("password", "salt")
+        self.assertEqual(
+            PooledScryptPasswordHasher().encode("password", "salt"), expected
+        )
+        with override_settings(PASSWORD_HASHING_WORKERS=0):
+            self.assertEqual(
+                PooledScryptPasswordHasher().encode("password", "salt"), expected
+            )
+
+    def test_broken_pool_is_replaced(self):
+        pool = hashing_pool()
+        # A killed process breaks the whole pool
+        with self.assertRaises(BrokenProcessPool):
+            pool.submit(os._exit, 1).result()
+
+        expected = ScryptPasswordHasher().encode("password", "salt")
+        with self.assertLogs("customer.hashers", "WARNING"):
+            self.assertEqual(
+                PooledScryptPasswordHasher().encode("password", "salt"), expected
+            )
+        self.assertIsNot(hashing_pool(), pool)
+        self.assertEqual(
+            PooledScryptPasswordHasher().encode("password", "salt"), expected
+        )
+
+    def test_new_passwords_use_scrypt(self):
+        user = User.objects.create_user(
+            email="test_user@example.com", password="password"
+        )
+        self.assertTrue(user.password.startswith("scrypt$"))
+
+    def test_pbkdf2_hash_upgraded_on_login(self):
+        user = User.objects.create_user(email="test_user@example.com")
+        user.password = make_password("password", hasher="pbkdf2_sha256")
+        user.save()
+
+        client = APIClient()
+        url = reverse("customer:token_obtain_pair")
+        credentials = {"email": user.email, "password": "password"}
+        response = client.post(url, credentials)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("scrypt$"))
+
+        response = client.post(url, credentials)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
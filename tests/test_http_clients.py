@@ -0,0 +1,95 @@
+import asyncio
+from unittest.mock import patch
+
+import requests
+import stripe
+from django.test import SimpleTestCase, override_settings
+
+from book.http_clients import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ResilientSession,
+    stripe_async_client,
+    stripe_breaker,
+)
+from tests.fakes import FakeTelegramServer
+
+
+class CircuitBreakerTest(SimpleTestCase):
+    def test_opens_after_failures_in_a_row(self):
+        breaker = CircuitBreaker("Test", failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_one_trial_after_reset_timeout(self):
+        breaker = CircuitBreaker("Test", failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record_success()
+        breaker.before_call()
+
+
+class StripeAsyncClientTest(SimpleTestCase):
+    def test_shared_within_an_event_loop(self):
+        async def clients():
+            return stripe_async_client(), stripe_async_client()
+
+        first, second = asyncio.run(clients())
+        self.assertIs(first, second)
+        # Connections can't move to another loop
+        self.assertIsNot(asyncio.run(clients())[0], first)
+
+
+@override_settings(HTTP_RETRY_BACKOFF=0)
+class ResilientSessionTest(SimpleTestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker("Test", failure_threshold=3, reset_timeout=60)
+        self.session = ResilientSession(self.breaker, timeout=1, retries=1)
+
+    def test_connection_errors_retried(self):
+        with FakeTelegramServer() as server:
+            url = server.url
+        with patch("time.sleep") as mock_sleep:
+            with self.assertRaises(requests.ConnectionError):
+                self.session.get(url)
+        mock_sleep.assert_called_once()
+        # Two attempts failed, the third one opens the circuit
+        self.session.retries = 0
+        with self.assertRaises(requests.ConnectionError):
+            self.session.get(url)
+        with self.assertRaises(CircuitOpenError):
+            self.session.get(url)
+
+    def test_server_errors_open_the_circuit(self):
+        with FakeTelegramServer() as server:
+            for _ in range(3):
+                server.responses.append((500, {"ok": False}))
+                self.assertEqual(self.session.post(server.url).status_code, 500)
+            with self.assertRaises(CircuitOpenError):
+                self.session.post(server.url)
+        self.assertEqual(len(server.messages), 0)
+
+
+class StripeConfigurationTest(SimpleTestCase):
+    def tearDown(self):
+        stripe_breaker.reset()
+
+    def test_configured_from_settings(self):
+        with override_settings(STRIPE_SECRET_KEY="sk_test_other"):
+            self.assertEqual(stripe.api_key, "sk_test_other")
+            session = stripe.default_http_client._session
+            self.assertIs(session.breaker, stripe_breaker)
+
+    @override_settings(STRIPE_SECRET_KEY="sk_test_fake")
+    def test_open_circuit_fails_fast(self):
+        for _ in range(stripe_breaker.failure_threshold):
+            stripe_breaker.record_failure()
+        with self.assertRaises(stripe.error.APIConnectionError):
+            stripe.checkout.Session.retrieve("cs_1")
@@ -0,0 +1,123 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from book.inventory import release_book, reserve_book
+from book.models import Book, Borrowing
+from customer.models import User
+
+
+class InventoryReservationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test_user@example.com", password="password"
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover="Soft",
+            daily_fee=9.99,
+            inventory=2,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_reserve_until_out_of_stock(self):
+        self.assertTrue(reserve_book(self.book.id))
+        self.assertTrue(reserve_book(self.book.id))
+        self.assertFalse(reserve_book(self.book.id))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+
+    def test_release_book(self):
+        release_book(self.book.id)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 3)
+
+    @patch("book.views.notify_borrowing_created")
+    def test_borrow_out_of_stock_book(self, mock_notify):
+        Book.objects.filter(pk=self.book.id).update(inventory=0)
+        response = self.client.post(
+            reverse("book:borrowing-list"),
+            {
+                "book": self.book.id,
+                "borrow_date": "2023-02-26",
+                "expected_return_date": "2023-03-05",
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Borrowing.objects.exists())
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+        mock_notify.assert_not_called()
+
+    @patch("book.views.notify_borrowing_created")
+    def test_failed_borrowing_keeps_inventory(self, mock_notify):
+        with patch("book.views.BorrowingSerializer.save", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post(
+                    reverse("book:borrowing-list"),
+                    {
+                        "book": self.book.id,
+                        "borrow_date": "2023-02-26",
+                        "expected_return_date": "2023-03-05",
+                    },
+                )
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 2)
+
+
+@skipUnless(
+    connection.vendor == "postgresql", "Concurrent writes need a PostgreSQL database"
+)
+class ConcurrentBorrowingLoadTest(TransactionTestCase):
+    copies = 50
+    borrowers = 300
+
+    def setUp(self):
+        self.book = Book.objects.create(
+            title="Popular Book",
+            author="Test Author",
+            cover="Hard",
+            daily_fee=1.99,
+            inventory=self.copies,
+        )
+        self.users = [
+            User.objects.create_user(email=f"user{i}@example.com", password="password")
+            for i in range(self.borrowers)
+        ]
+
+    def borrow(self, user: User) -> int:
+        client = APIClient()
+        client.force_authenticate(user=user)
+        try:
+            response = client.post(
+                reverse("book:borrowing-list"),
+                {
+                    "book": self.book.id,
+                    "borrow_date": "2023-02-26",
+                    "expected_return_date": "2023-03-05",
+                },
+            )
+            return response.status_code
+        finally:
+            connection.close()
+
+    @patch("book.views.notify_borrowing_created")
+    def test_concurrent_borrowings_never_oversell(self, mock_notify):
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            results = list(executor.map(self.borrow, self.users))
+
+        self.assertEqual(results.count(status.HTTP_201_CREATED), self.copies)
+        self.assertEqual(
+            results.count(status.HTTP_400_BAD_REQUEST), self.borrowers - self.copies
+        )
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+        self.assertEqual(Borrowing.objects.count(), self.copies)
@@ -0,0 +1,92 @@
+import os
+from unittest.mock import patch
+
+import stripe
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+
+from book.models import Book, Borrowing, Payment
+from book.strype_service import retrieve_sessions
+from book.tasks import send_pending_telegram_messages
+from customer.models import User
+from library_service_api.metrics import _serve_worker_metrics
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Book.objects.create(
+            title="Test Book", author="Test Author", cover="Soft", daily_fee=1
+        )
+
+    def test_request_metrics(self):
+        labels = dict(view="book:book-list", method="GET", status="200")
+        before = sample("http_request_duration_seconds_count", **labels)
+        queries_before = sample("http_request_db_queries_sum", view="book:book-list")
+
+        self.client.get(reverse("book:book-list"))
+
+        self.assertEqual(
+            sample("http_request_duration_seconds_count", **labels), before + 1
+        )
+        self.assertGreater(
+            sample("http_request_db_queries_sum", view="book:book-list"),
+            queries_before,
+        )
+        response = self.client.get(reverse("metrics"))
+        self.assertContains(response, 'view="book:book-list"')
+
+    def test_async_view_queries_counted(self):
+        user = User.objects.create_user(
+            email="test_user@example.com", password="password"
+        )
+        today = timezone.now().date()
+        borrowing = Borrowing.objects.create(
+            book=Book.objects.get(),
+            user=user,
+            borrow_date=today,
+            expected_return_date=today,
+        )
+        Payment.objects.create(borrowing=borrowing, money_to_pay=1, session_id="cs_1")
+        before = sample("http_request_db_queries_sum", view="book:payment_success")
+
+        self.client.get(reverse("book:payment_success"), {"session_id": "cs_1"})
+
+        self.assertEqual(
+            sample("http_request_db_queries_sum", view="book:payment_success"),
+            before + 1,
+        )
+
+    def test_external_call_errors(self):
+        labels = dict(service="stripe", operation="retrieve_session", outcome="error")
+        before = sample("external_call_duration_seconds_count", **labels)
+        with patch("stripe.checkout.Session.retrieve") as mock_retrieve:
+            mock_retrieve.side_effect = stripe.error.APIConnectionError("down")
+            self.assertEqual(retrieve_sessions(["cs_1", "cs_2"]), {})
+        self.assertEqual(
+            sample("external_call_duration_seconds_count", **labels), before + 2
+        )
+
+    def test_task_duration(self):
+        labels = dict(task=send_pending_telegram_messages.name, state="SUCCESS")
+        before = sample("celery_task_duration_seconds_count", **labels)
+        send_pending_telegram_messages.apply()
+        self.assertEqual(
+            sample("celery_task_duration_seconds_count", **labels), before + 1
+        )
+
+    @patch("library_service_api.metrics.start_http_server")
+    def test_worker_metrics_need_multiprocess_dir(self, mock_start):
+        with patch.dict("os.environ"), self.assertLogs(
+            "library_service_api.metrics", "WARNING"
+        ):
+            os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+            _serve_worker_metrics()
+        mock_start.assert_called_once()
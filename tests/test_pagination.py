@@ -0,0 +1,74 @@
+from datetime import date, timedelta
+
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from book.models import Book, Borrowing, Payment
+from customer.models import User
+
+
+class ListPaginationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test_user@example.com", password="password", is_superuser=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}", author="Test Author", cover="Soft", daily_fee=1
+            )
+            for i in range(7)
+        ]
+        today = date.today()
+        self.borrowings = [
+            Borrowing.objects.create(
+                book=book,
+                user=self.user,
+                borrow_date=today,
+                expected_return_date=today + timedelta(days=7),
+            )
+            for book in self.books
+        ]
+        for borrowing in self.borrowings:
+            Payment.objects.create(borrowing=borrowing, money_to_pay=1)
+
+    def collect_pages(self, url: str) -> list:
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 3)
+            ids += [item["id"] for item in response.data["results"]]
+            url = response.data["next"]
+        return ids
+
+    def test_borrowings_paged_newest_first(self):
+        ids = self.collect_pages(reverse("book:borrowing-list") + "?page_size=3")
+        self.assertEqual(
+            ids, sorted((borrowing.id for borrowing in self.borrowings), reverse=True)
+        )
+
+    def test_payments_paged_newest_first(self):
+        ids = self.collect_pages(reverse("book:payments-list") + "?page_size=3")
+        self.assertEqual(
+            ids, list(Payment.objects.order_by("-id").values_list("id", flat=True))
+        )
+
+    def test_page_after_new_rows_has_no_duplicates(self):
+        response = self.client.get(reverse("book:payments-list") + "?page_size=3")
+        first_page = [item["id"] for item in response.data["results"]]
+        Payment.objects.create(borrowing=self.borrowings[0], money_to_pay=1)
+        second_page = self.client.get(response.data["next"]).data["results"]
+        self.assertFalse(set(first_page) & {item["id"] for item in second_page})
+        self.assertEqual(second_page[0]["id"], first_page[-1] - 1)
+
+    def test_books_paged_by_number(self):
+        response = self.client.get(reverse("book:book-list") + "?page=2&page_size=5")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 7)
+        self.assertEqual(
+            [book["title"] for book in response.data["results"]], ["Book 5", "Book 6"]
+        )
@@ -0,0 +1,82 @@
+from datetime import date, timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from book.models import Book, Borrowing, Payment
+from customer.models import User
+
+
+class PaymentViewsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test_user@example.com", password="password"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        today = date.today()
+        self.payments = []
+        for i in range(20):
+            book = Book.objects.create(
+                title=f"Book {i}", author="Test Author", cover="Soft", daily_fee=1
+            )
+            borrowing = Borrowing.objects.create(
+                book=book,
+                user=self.user,
+                borrow_date=today,
+                expected_return_date=today + timedelta(days=7),
+            )
+            self.payments.append(
+                Payment.objects.create(borrowing=borrowing, money_to_pay=7)
+            )
+
+    def count_queries(self, url: str) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_list_query_count_constant_with_page_size(self):
+        url = reverse("book:payments-list")
+        for expand in ("", "book,user"):
+            self.assertEqual(
+                self.count_queries(f"{url}?page_size=2&expand={expand}"),
+                self.count_queries(f"{url}?page_size=20&expand={expand}"),
+            )
+
+    def test_list_expand(self):
+        response = self.client.get(
+            reverse("book:payments-list"), {"expand": "book,user"}
+        )
+        payment = response.data["results"][0]
+        self.assertEqual(payment["book_title"], "Book 19")
+        self.assertEqual(payment["user_email"], self.user.email)
+
+        response = self.client.get(
+            reverse("book:payments-list"), {"expand": "book,unknown"}
+        )
+        payment = response.data["results"][0]
+        self.assertIn("book_title", payment)
+        self.assertNotIn("user_email", payment)
+
+        response = self.client.get(reverse("book:payments-list"))
+        self.assertNotIn("book_title", response.data["results"][0])
+
+    def test_detail_expand_in_one_query(self):
+        url = reverse("book:payment-detail", kwargs={"pk": self.payments[0].id})
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {"expand": "user"})
+        self.assertEqual(response.data["user_email"], self.user.email)
+        self.assertNotIn("book_title", response.data)
+
+    def test_other_users_payment_hidden(self):
+        other_user = User.objects.create_user(
+            email="other_user@example.com", password="password"
+        )
+        self.client.force_authenticate(user=other_user)
+        url = reverse("book:payment-detail", kwargs={"pk": self.payments[0].id})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,208 @@
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from book import urls
+from book.models import Book, Borrowing, Payment
+from customer.models import User
+from library_service_api.profiling import get_query_budget, slow_requests
+from tests.fakes import FakeStripeServer, signed_stripe_event
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin checking that a request stays within the
+    query budget declared by the view serving it
+    """
+
+    def assert_query_budget(self, method: str, url: str, data=None, **extra):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, **extra)
+            if response.streaming:
+                # Streamed rows are queried while the body is read
+                response.streaming_content = list(response.streaming_content)
+        budget = get_query_budget(response.resolver_match.func)
+        self.assertIsNotNone(budget, f"{url} has no query budget")
+        # Savepoints of the view's transactions aside
+        statements = [
+            query["sql"]
+            for query in queries.captured_queries
+            if "SAVEPOINT" not in query["sql"]
+        ]
+        self.assertLessEqual(len(statements), budget, "\n".join(statements))
+        return response
+
+
+def create_book(i: int) -> Book:
+    return Book.objects.create(
+        title=f"Book {i}", author="Test Author", cover="Soft", daily_fee=1, inventory=5
+    )
+
+
+@override_settings(STRIPE_SECRET_KEY="sk_test_fake")
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test_user@example.com", password="password"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        today = date.today()
+        self.books = [create_book(i) for i in range(5)]
+        self.borrowings = [
+            Borrowing.objects.create(
+                book=book,
+                user=self.user,
+                borrow_date=today,
+                expected_return_date=today + timedelta(days=7),
+            )
+            for book in self.books
+        ]
+        self.payments = [
+            Payment.objects.create(
+                borrowing=borrowing, money_to_pay=7, session_id=f"cs_{borrowing.id}"
+            )
+            for borrowing in self.borrowings
+        ]
+
+    def test_every_view_declares_a_budget(self):
+        for pattern in urls.urlpatterns:
+            if isinstance(pattern, URLPattern):
+                self.assertIsNotNone(get_query_budget(pattern.callback), pattern.name)
+
+    def test_books(self):
+        self.client.force_authenticate(
+            User.objects.create_user(
+                email="admin@example.com", password="password", is_staff=True
+            )
+        )
+        response = self.assert_query_budget(
+            "post",
+            reverse("book:book-list"),
+            {"title": "New", "author": "Author", "cover": "Hard", "daily_fee": "1.00"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assert_query_budget("get", reverse("book:book-list"))
+        url = reverse("book:book-detail", kwargs={"pk": self.books[0].id})
+        self.assert_query_budget("get", url)
+        self.assert_query_budget("patch", url, {"daily_fee": "2.00"})
+        self.assert_query_budget("delete", url)
+
+    def test_borrowings(self):
+        self.assert_query_budget("get", reverse("book:borrowing-list"))
+        url = reverse("book:borrowing-detail", kwargs={"pk": self.borrowings[0].id})
+        self.assert_query_budget("get", url)
+        self.assert_query_budget("delete", url)
+        self.assert_query_budget("get", reverse("book:borrowing-export"))
+        Payment.objects.update(status=Payment.PAID)
+        response = self.assert_query_budget(
+            "post",
+            reverse("book:borrowing-list"),
+            {
+                "book": self.books[0].id,
+                "borrow_date": date.today(),
+                "expected_return_date": date.today() + timedelta(days=7),
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_bulk_borrowings(self):
+        Payment.objects.update(status=Payment.PAID)
+        response = self.assert_query_budget(
+            "post",
+            reverse("book:borrowing-bulk-create"),
+            {
+                "books": [book.id for book in self.books],
+                "borrow_date": date.today(),
+                "expected_return_date": date.today() + timedelta(days=7),
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        with FakeStripeServer() as server, patch("stripe.api_base", server.url):
+            response = self.assert_query_budget(
+                "post",
+                reverse("book:borrowing-bulk-return"),
+                {"borrowings": [borrowing.id for borrowing in self.borrowings]},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_return(self):
+        with FakeStripeServer() as server, patch("stripe.api_base", server.url):
+            response = self.assert_query_budget(
+                "post",
+                reverse("book:borrowing-return", kwargs={"pk": self.borrowings[0].id}),
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assert_query_budget("get", response.data["payment_session_url"])
+            self.assert_query_budget(
+                "get",
+                reverse(
+                    "book:initiate_payment", kwargs={"payment_id": self.payments[0].id}
+                ),
+            )
+
+    def test_payments(self):
+        self.assert_query_budget("get", reverse("book:payments-list"))
+        self.assert_query_budget(
+            "get", reverse("book:payments-list"), {"expand": "book,user"}
+        )
+        self.assert_query_budget("get", reverse("book:payment-export"))
+        self.assert_query_budget(
+            "get", reverse("book:payment-detail", kwargs={"pk": self.payments[0].id})
+        )
+        session = {"session_id": self.payments[0].session_id}
+        self.assert_query_budget("get", reverse("book:payment_success"), session)
+        self.assert_query_budget("get", reverse("book:payment_cancel"), session)
+
+        payload, signature = signed_stripe_event(
+            "checkout.session.completed", {"id": "cs_1"}, "whsec_test"
+        )
+        with override_settings(STRIPE_WEBHOOK_SECRET="whsec_test"):
+            response = self.assert_query_budget(
+                "post",
+                reverse("book:stripe-webhook"),
+                payload,
+                content_type="application/json",
+                HTTP_STRIPE_SIGNATURE=signature,
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class QueryProfilerTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for i in range(3):
+            create_book(i)
+
+    @override_settings(QUERY_PROFILER=True, QUERY_PROFILER_SLOW_MS=0)
+    def test_slow_requests_sampled(self):
+        response = self.client.get(reverse("book:book-list"))
+        self.assertRegex(
+            response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries"'
+        )
+
+        sample = slow_requests()[0]
+        self.assertEqual(sample["view"], "book:book-list")
+        self.assertGreater(sample["queries"], 0)
+
+        url = reverse("profiler-slow-requests")
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+        admin = User.objects.create_superuser(
+            email="admin@example.com", password="password"
+        )
+        self.client.force_authenticate(user=admin)
+        paths = [request["path"] for request in self.client.get(url).data]
+        self.assertIn(sample["path"], paths)
+
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse("book:book-list"))
+        self.assertNotIn("Server-Timing", response)
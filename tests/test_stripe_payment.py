@@ -1,12 +1,32 @@
+import asyncio
+import uuid
 from datetime import timedelta
+from functools import partial
 from unittest.mock import MagicMock, patch
-from django.test import TestCase
+
+import stripe
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
 from django.utils import timezone
 from rest_framework.test import APIClient
 
-from book.models import Payment, Book, Borrowing
-from book.views import create_payment_session
+from book.models import Payment, Book, Borrowing, TelegramMessage
+from book.tasks import (
+    check_expired_sessions,
+    create_batch_checkout_session,
+    create_missing_checkout_sessions,
+    create_payment_checkout_session,
+)
+from book.strype_service import (
+    _astripe_post,
+    _form_encode,
+    acreate_payment_session,
+    create_payment_session,
+)
 from customer.models import User
+from tests.fakes import FakeStripeServer
 
 
 class CreatePaymentSessionTest(TestCase):
@@ -36,6 +56,7 @@ class CreatePaymentSessionTest(TestCase):
         )
         self.client = APIClient()
 
+    @override_settings(STRIPE_SECRET_KEY="sk_test_fake")
     @patch("stripe.checkout.Session.create")
     def test_create_payment_session(self, mock_create_session: MagicMock):
         session_id = "session_id"
@@ -50,3 +71,277 @@ class CreatePaymentSessionTest(TestCase):
         self.assertEqual(self.payment.session_id, session_id)
         self.assertEqual(self.payment.session_url, session_url)
         self.assertTrue(mock_create_session.called)
+        self.payment.refresh_from_db()
+        self.assertEqual(
+            int(self.payment.session_expires_at.timestamp()),
+            mock_create_session.call_args.kwargs["expires_at"],
+        )
+        self.assertTrue(
+            mock_create_session.call_args.kwargs["idempotency_key"].startswith(
+                "checkout-"
+            )
+        )
+
+    @override_settings(STRIPE_SECRET_KEY="sk_test_fake")
+    @patch("stripe.checkout.Session.create")
+    def test_valid_session_is_reused(self, mock_create_session: MagicMock):
+        Payment.objects.filter(pk=self.payment.pk).update(
+            session_id="cs_stored",
+            session_url="https://checkout.stripe.com/cs_stored",
+            session_expires_at=timezone.now() + timedelta(minutes=20),
+        )
+
+        session_id, _ = create_payment_session(self.payment)
+        self.assertEqual(session_id, "cs_stored")
+        self.assertFalse(mock_create_session.called)
+
+        # A session about to expire is replaced, under a new key
+        Payment.objects.filter(pk=self.payment.pk).update(
+            session_expires_at=timezone.now() + timedelta(seconds=30)
+        )
+        mock_create_session.return_value = MagicMock(id="cs_new", url="url")
+        session_id, _ = create_payment_session(self.payment)
+        self.assertEqual(session_id, "cs_new")
+        self.assertEqual(mock_create_session.call_count, 1)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.session_id, "cs_new")
+
+    def test_retry_gets_the_claimed_session(self):
+        store_fails = partial(
+            patch, "book.strype_service._record_session", side_effect=RuntimeError
+        )
+        with FakeStripeServer() as server, server.serving_stripe():
+            # The session is created, but the caller fails to store it
+            with store_fails(), self.assertRaises(RuntimeError):
+                create_payment_session(self.payment)
+
+            # A retry a minute boundary later shares the claim, and the session
+            later = timezone.now() + timedelta(seconds=50)
+            with patch("django.utils.timezone.now", return_value=later):
+                with store_fails(), self.assertRaises(RuntimeError):
+                    create_payment_session(self.payment)
+            self.assertEqual(len(server.sessions), 1)
+
+            # Once the claim times out, a new session is claimed
+            later += timedelta(minutes=2)
+            with patch("django.utils.timezone.now", return_value=later):
+                session_id, _ = create_payment_session(self.payment)
+            self.assertEqual(session_id, "cs_fake_1")
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.session_id, "cs_fake_1")
+
+    @override_settings(STRIPE_SECRET_KEY="sk_test_fake")
+    def test_initiate_payment_async(self):
+        with FakeStripeServer() as server, patch("stripe.api_base", server.url):
+            url = reverse(
+                "book:initiate_payment", kwargs={"payment_id": self.payment.id}
+            )
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            # A retry gets the session created by the first call
+            self.assertEqual(self.client.get(url).json(), response.json())
+            self.assertEqual(server.requests, ["POST /v1/checkout/sessions"])
+
+            with self.assertRaises(stripe.error.APIError):
+                async_to_sync(_astripe_post)("/v1/unknown", {})
+
+        self.payment.refresh_from_db()
+        self.assertEqual(response.json()["session_id"], self.payment.session_id)
+        self.assertEqual(response.json()["session_url"], self.payment.session_url)
+        self.assertIsNotNone(self.payment.session_expires_at)
+
+    def test_params_form_encoded_like_stripe(self):
+        params = {
+            "line_items": [{"price_data": {"unit_amount": 500}, "quantity": 1}],
+            "mode": "payment",
+            "customer": None,
+            "allow_promotion_codes": False,
+        }
+        self.assertEqual(
+            dict(_form_encode(params)),
+            {
+                "line_items[0][price_data][unit_amount]": "500",
+                "line_items[0][quantity]": "1",
+                "mode": "payment",
+                "allow_promotion_codes": "false",
+            },
+        )
+
+    @override_settings(STRIPE_SECRET_KEY="sk_test_fake")
+    def test_concurrent_initiations_make_one_stripe_call(self):
+        async def initiate_twice():
+            payments = [
+                await Payment.objects.select_related("borrowing__book").aget(
+                    pk=self.payment.pk
+                )
+                for _ in range(2)
+            ]
+            return await asyncio.gather(
+                *(acreate_payment_session(payment) for payment in payments)
+            )
+
+        with FakeStripeServer(latency=0.2) as server, patch(
+            "stripe.api_base", server.url
+        ):
+            first, second = async_to_sync(initiate_twice)()
+
+        self.assertEqual(first, second)
+        self.assertEqual(server.requests, ["POST /v1/checkout/sessions"])
+
+    def test_initiate_paid_payment(self):
+        Payment.objects.filter(pk=self.payment.pk).update(status=Payment.PAID)
+
+        response = self.client.get(
+            reverse("book:initiate_payment", kwargs={"payment_id": self.payment.id})
+        )
+
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            reverse("book:initiate_payment", kwargs={"payment_id": 0})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class CreateMissingCheckoutSessionsTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(
+            email="test_user@example.com", password="password"
+        )
+        book = Book.objects.create(
+            title="Test Book", author="Test Author", cover="Soft", daily_fee=1
+        )
+        borrowing = Borrowing.objects.create(
+            book=book,
+            user=user,
+            borrow_date=timezone.now().date(),
+            expected_return_date=timezone.now().date() + timedelta(days=7),
+        )
+        self.create_payment = partial(
+            Payment.objects.create, borrowing=borrowing, money_to_pay=10
+        )
+
+    @patch.object(create_payment_checkout_session, "delay")
+    def test_payments_without_session_queued_again(self, mock_delay: MagicMock):
+        long_ago = timezone.now() - timedelta(hours=1)
+        lost = self.create_payment(created_at=long_ago)
+        # Its task may still be running
+        self.create_payment()
+        self.create_payment(created_at=long_ago, session_id="cs_1")
+        self.create_payment(created_at=long_ago, status=Payment.CANCELED)
+
+        self.assertEqual(create_missing_checkout_sessions(), 1)
+        mock_delay.assert_called_once_with(lost.pk)
+
+    @patch.object(create_batch_checkout_session, "delay")
+    @patch.object(create_payment_checkout_session, "delay")
+    def test_bulk_return_queued_again_as_one_batch(
+        self, mock_delay: MagicMock, mock_batch_delay: MagicMock
+    ):
+        long_ago = timezone.now() - timedelta(hours=1)
+        batch_id = uuid.uuid4()
+        batch = [
+            self.create_payment(created_at=long_ago, batch_id=batch_id)
+            for _ in range(2)
+        ]
+
+        self.assertEqual(create_missing_checkout_sessions(), 2)
+        mock_batch_delay.assert_called_once_with(
+            sorted(payment.pk for payment in batch)
+        )
+        mock_delay.assert_not_called()
+
+
+@override_settings(STRIPE_SECRET_KEY="sk_test_fake", CONCURRENT_REQUESTS=4)
+class CheckExpiredSessionsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="test_user", email="test_user@example.com", password="password"
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover="Soft",
+            daily_fee=9.99,
+        )
+        self.borrowing = Borrowing.objects.create(
+            book=self.book,
+            user=self.user,
+            borrow_date=timezone.now().date(),
+            expected_return_date=timezone.now().date() + timedelta(days=7),
+        )
+
+    def create_payment(self, session_id: str, expires_in: int = None) -> Payment:
+        payment = Payment(
+            borrowing=self.borrowing,
+            money_to_pay=10,
+            session_id=session_id,
+            session_url="",
+        )
+        if expires_in is not None:
+            payment.session_expires_at = timezone.now() + timedelta(seconds=expires_in)
+        payment.save()
+        return payment
+
+    def test_statuses_reconciled_with_stripe(self):
+        expired = self.create_payment("cs_expired")
+        paid = self.create_payment("cs_paid")
+        open_payment = self.create_payment("cs_open")
+        batch = [self.create_payment("cs_batch") for _ in range(3)]
+
+        with FakeStripeServer() as server:
+            server.sessions = {
+                "cs_expired": {"status": "expired"},
+                "cs_paid": {"status": "complete", "payment_status": "paid"},
+                "cs_batch": {"status": "expired"},
+            }
+            with patch("stripe.api_base", server.url):
+                self.assertEqual(check_expired_sessions(), 5)
+
+        # Payments sharing a session are looked up once
+        self.assertEqual(len(server.requests), 4)
+        statuses = dict(Payment.objects.values_list("id", "status"))
+        self.assertEqual(statuses[expired.id], Payment.EXPIRED)
+        self.assertEqual(statuses[paid.id], Payment.PAID)
+        self.assertEqual(statuses[open_payment.id], Payment.PENDING)
+        self.assertTrue(all(statuses[p.id] == Payment.EXPIRED for p in batch))
+        self.assertEqual(TelegramMessage.objects.count(), 1)
+
+    def test_unreachable_session_is_skipped(self):
+        payment = self.create_payment("cs_missing")
+        with patch("stripe.checkout.Session.retrieve") as mock_retrieve:
+            mock_retrieve.side_effect = stripe.error.APIConnectionError("down")
+            self.assertEqual(check_expired_sessions(), 0)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.PENDING)
+
+    @override_settings(STRIPE_EXPIRY_GRACE=600)
+    def test_only_boundary_sessions_checked_with_stripe(self):
+        long_expired = self.create_payment("cs_long_expired", expires_in=-3600)
+        just_expired = self.create_payment("cs_just_expired", expires_in=-60)
+        still_open = self.create_payment("cs_still_open", expires_in=600)
+
+        with FakeStripeServer() as server:
+            server.sessions = {"cs_just_expired": {"status": "expired"}}
+            with patch("stripe.api_base", server.url):
+                self.assertEqual(check_expired_sessions(), 2)
+
+        self.assertEqual(server.requests, ["GET /v1/checkout/sessions/cs_just_expired"])
+        statuses = dict(Payment.objects.values_list("id", "status"))
+        self.assertEqual(statuses[long_expired.id], Payment.EXPIRED)
+        self.assertEqual(statuses[just_expired.id], Payment.EXPIRED)
+        self.assertEqual(statuses[still_open.id], Payment.PENDING)
+
+    def test_sessions_checked_within_expiry_grace(self):
+        schedule = settings.CELERY_BEAT_SCHEDULE["check-expired-sessions"]
+        self.assertEqual(schedule["task"], check_expired_sessions.name)
+        self.assertLess(schedule["schedule"], settings.STRIPE_EXPIRY_GRACE)
+
+    def test_unknown_deadline_is_stored(self):
+        payment = self.create_payment("cs_legacy")
+        with FakeStripeServer() as server:
+            with patch("stripe.api_base", server.url):
+                self.assertEqual(check_expired_sessions(), 0)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.PENDING)
+        self.assertGreater(payment.session_expires_at, timezone.now())
@@ -0,0 +1,164 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from book.models import Book, Borrowing, Payment, StripeEvent, TelegramMessage
+from book.strype_service import apply_stripe_events
+from customer.models import User
+from tests.fakes import signed_stripe_event
+
+WEBHOOK_SECRET = "whsec_test"
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class StripeWebhookTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test_user@example.com", password="password"
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover="Soft",
+            daily_fee=9.99,
+        )
+        self.borrowing = Borrowing.objects.create(
+            book=self.book,
+            user=self.user,
+            borrow_date=timezone.now().date(),
+            expected_return_date=timezone.now().date() + timedelta(days=7),
+        )
+        self.url = reverse("book:stripe-webhook")
+
+    def create_payment(self, session_id: str, **kwargs) -> Payment:
+        return Payment.objects.create(
+            borrowing=self.borrowing,
+            money_to_pay=10,
+            session_id=session_id,
+            session_url="",
+            **kwargs,
+        )
+
+    def post_event(self, event_type: str, session: dict, **kwargs):
+        payload, signature = signed_stripe_event(
+            event_type, session, WEBHOOK_SECRET, **kwargs
+        )
+        return self.client.post(
+            self.url,
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=signature,
+        )
+
+    def test_event_is_stored(self):
+        response = self.post_event(
+            "checkout.session.completed", {"id": "cs_1", "payment_status": "paid"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        event = StripeEvent.objects.get()
+        self.assertEqual(event.type, "checkout.session.completed")
+        self.assertEqual(event.payload["data"]["object"]["id"], "cs_1")
+        self.assertEqual(event.status, StripeEvent.PENDING)
+
+    def test_redelivered_event_is_stored_once(self):
+        for _ in range(2):
+            response = self.post_event(
+                "checkout.session.expired", {"id": "cs_1"}, event_id="evt_1"
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(StripeEvent.objects.count(), 1)
+
+    def test_invalid_signature_is_rejected(self):
+        payload, signature = signed_stripe_event(
+            "checkout.session.expired", {"id": "cs_1"}, "whsec_other"
+        )
+        response = self.client.post(
+            self.url,
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=signature,
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_events_applied_to_payments(self):
+        paid = [self.create_payment("cs_paid") for _ in range(2)]
+        expired = self.create_payment("cs_expired")
+        unpaid = self.create_payment("cs_unpaid")
+        self.post_event(
+            "checkout.session.completed", {"id": "cs_paid", "payment_status": "paid"}
+        )
+        self.post_event("checkout.session.expired", {"id": "cs_expired"})
+        self.post_event(
+            "checkout.session.completed",
+            {"id": "cs_unpaid", "payment_status": "unpaid"},
+        )
+        self.post_event("customer.created", {"id": "cus_1"})
+
+        self.assertEqual(apply_stripe_events(), 4)
+
+        statuses = dict(Payment.objects.values_list("id", "status"))
+        self.assertEqual(
+            [statuses[payment.id] for payment in paid], [Payment.PAID, Payment.PAID]
+        )
+        self.assertEqual(statuses[expired.id], Payment.EXPIRED)
+        self.assertEqual(statuses[unpaid.id], Payment.PENDING)
+        # One message for the two payments of the session
+        self.assertEqual(
+            list(TelegramMessage.objects.values_list("text", flat=True)),
+            [
+                f"Successful payment: {self.user.email} paid 20.00 for Test Book, Test Book"
+            ],
+        )
+        self.assertFalse(StripeEvent.objects.filter(status=StripeEvent.PENDING))
+        self.assertEqual(apply_stripe_events(), 0)
+
+    def test_late_payment_overrides_local_expiry(self):
+        payment = self.create_payment("cs_late", status=Payment.EXPIRED)
+        self.post_event(
+            "checkout.session.async_payment_succeeded",
+            {"id": "cs_late", "payment_status": "paid"},
+        )
+        apply_stripe_events()
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.PAID)
+
+    def test_expiry_does_not_override_payment(self):
+        payment = self.create_payment("cs_paid", status=Payment.PAID)
+        self.post_event("checkout.session.expired", {"id": "cs_paid"})
+        apply_stripe_events()
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.PAID)
+
+    def test_success_redirect_reads_local_status(self):
+        self.create_payment("cs_paid", status=Payment.PAID)
+        self.create_payment("cs_pending")
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("book:payment_success"), {"session_id": "cs_paid"}
+            )
+        self.assertEqual(response.json(), {"message": "Payment successful"})
+        response = self.client.get(
+            reverse("book:payment_success"), {"session_id": "cs_pending"}
+        )
+        self.assertEqual(response.json()["status"], Payment.PENDING)
+        response = self.client.get(
+            reverse("book:payment_success"), {"session_id": "cs_unknown"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_redirect_without_session_id_not_found(self):
+        # Payments whose session isn't created yet have an empty session_id
+        self.create_payment("")
+        for url in (reverse("book:payment_success"), reverse("book:payment_cancel")):
+            with self.assertNumQueries(0):
+                self.assertEqual(
+                    self.client.get(url, {"session_id": ""}).status_code,
+                    status.HTTP_404_NOT_FOUND,
+                )
+                self.assertEqual(
+                    self.client.get(url).status_code, status.HTTP_404_NOT_FOUND
+                )
@@ -1,18 +1,26 @@
 from datetime import timedelta
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.utils import timezone
-from django.conf import settings
-from unittest.mock import patch, MagicMock
 
-from book.models import Payment, Borrowing, Book
+from book.models import Payment, Borrowing, Book, TelegramMessage
+from book.tasks import run_sync_with_api
 from book.telegram_bot import (
+    deliver_pending_messages,
+    enqueue_telegram_message,
     notify_successful_payment,
     notify_overdue_borrowing,
     notify_borrowing_created,
     send_telegram_message,
 )
 from customer.models import User
+from tests.fakes import FakeTelegramServer
+
+TELEGRAM_SETTINGS = {
+    "TELEGRAM_BOT_TOKEN": "token",
+    "TELEGRAM_CHAT_ID": "chat",
+    "TELEGRAM_MESSAGES_PER_SECOND": 1000,
+}
 
 
 class UtilsTestCase(TestCase):
@@ -38,56 +46,159 @@ class UtilsTestCase(TestCase):
             borrowing=self.borrowing, money_to_pay=10.00
         )
 
-    @patch("requests.get")
-    def test_send_telegram_message(self, mock_requests):
-        mock_response = MagicMock()
-        mock_response.json.return_value = {"ok": True}
-        mock_requests.return_value = mock_response
-        message = "This is a test message"
-        response = send_telegram_message(message)
-        mock_requests.assert_called_once_with(
-            f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/"
-            f"sendMessage?chat_id={settings.TELEGRAM_CHAT_ID}&text={message}"
-        )
-        self.assertEqual(response, {"ok": True})
+    def test_send_telegram_message(self):
+        message = "This is a test message & more"
+        with FakeTelegramServer() as server:
+            with override_settings(TELEGRAM_API_URL=server.url, **TELEGRAM_SETTINGS):
+                response = send_telegram_message(message)
+        self.assertEqual(server.messages, [message])
+        self.assertEqual(response, {"ok": True, "result": {}})
 
-    @patch("requests.get")
-    def test_notify_borrowing_created(self, mock_requests):
-        mock_response = MagicMock()
-        mock_response.json.return_value = {"ok": True}
-        mock_requests.return_value = mock_response
+    def test_notify_borrowing_created(self):
         message = f"New borrowing created: {self.user.email} borrowed {self.book.title}"
-        response = notify_borrowing_created(self.borrowing)
-        mock_requests.assert_called_once_with(
-            f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/"
-            f"sendMessage?chat_id={settings.TELEGRAM_CHAT_ID}&text={message}"
-        )
-        self.assertEqual(response, {"ok": True})
+        outbox_message = notify_borrowing_created(self.borrowing)
+        self.assertEqual(outbox_message.text, message)
+        self.assertEqual(outbox_message.status, TelegramMessage.PENDING)
 
-    @patch("requests.get")
-    def test_notify_overdue_borrowing(self, mock_requests):
-        mock_response = MagicMock()
-        mock_response.json.return_value = {"ok": True}
-        mock_requests.return_value = mock_response
+    def test_notify_overdue_borrowing(self):
         expected_return_date = timezone.now().date() - timedelta(days=1)
         self.borrowing.expected_return_date = expected_return_date
         self.borrowing.save()
-        message = f"Overdue borrowings: {self.user.email} should have returned {self.book.title} by {expected_return_date}"
-        notify_overdue_borrowing([self.borrowing])
-        mock_requests.assert_called_once_with(
-            f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/"
-            f"sendMessage?chat_id={settings.TELEGRAM_CHAT_ID}&text={message}"
-        )
+        message = f"Overdue borrowings:\n{self.user.email} should have returned {self.book.title} by {expected_return_date}"
+        outbox_messages = notify_overdue_borrowing([self.borrowing])
+        self.assertEqual([m.text for m in outbox_messages], [message])
 
-    @patch("requests.get")
-    def test_notify_successful_payment(self, mock_requests):
-        mock_response = MagicMock()
-        mock_response.json.return_value = {"ok": True}
-        mock_requests.return_value = mock_response
+    def test_notify_successful_payment(self):
         message = f"Successful payment: {self.user.email} paid {self.payment.money_to_pay} for {self.book.title}"
-        response = notify_successful_payment(self.payment)
-        mock_requests.assert_called_once_with(
-            f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/"
-            f"sendMessage?chat_id={settings.TELEGRAM_CHAT_ID}&text={message}"
+        outbox_message = notify_successful_payment(self.payment)
+        self.assertEqual(outbox_message.text, message)
+
+
+class OverdueBorrowingReportTestCase(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover="Soft",
+            daily_fee=9.99,
+        )
+        self.today = timezone.now().date()
+
+    def create_borrowings(self, count: int, **kwargs) -> None:
+        for _ in range(count):
+            user = User.objects.create_user(
+                email=f"user{Borrowing.objects.count()}@example.com",
+                password="password",
+            )
+            Borrowing.objects.create(
+                book=self.book,
+                user=user,
+                borrow_date=self.today - timedelta(days=10),
+                **kwargs,
+            )
+
+    def test_only_overdue_borrowings_reported(self):
+        self.create_borrowings(2, expected_return_date=self.today - timedelta(days=1))
+        self.create_borrowings(1, expected_return_date=self.today)
+        self.create_borrowings(
+            1,
+            expected_return_date=self.today - timedelta(days=1),
+            actual_return_date=self.today,
         )
-        self.assertEqual(response, {"ok": True})
+        run_sync_with_api()
+        message = TelegramMessage.objects.get()
+        self.assertEqual(len(message.text.splitlines()), 3)
+
+    def test_query_count_does_not_grow_with_overdue_borrowings(self):
+        self.create_borrowings(5, expected_return_date=self.today - timedelta(days=1))
+        with self.assertNumQueries(2):
+            run_sync_with_api()
+        self.create_borrowings(20, expected_return_date=self.today - timedelta(days=1))
+        with self.assertNumQueries(2):
+            run_sync_with_api()
+
+    @override_settings(TELEGRAM_MESSAGE_LIMIT=200)
+    def test_report_split_under_message_limit(self):
+        self.create_borrowings(10, expected_return_date=self.today - timedelta(days=1))
+        run_sync_with_api()
+        messages = TelegramMessage.objects.all()
+        self.assertGreater(len(messages), 1)
+        self.assertTrue(all(len(message.text) <= 200 for message in messages))
+        self.assertEqual(
+            sum(len(message.text.splitlines()) - 1 for message in messages), 10
+        )
+
+    def test_no_overdue_borrowings(self):
+        run_sync_with_api()
+        self.assertEqual(
+            TelegramMessage.objects.get().text, "No borrowings overdue today!"
+        )
+
+
+@override_settings(**TELEGRAM_SETTINGS)
+class TelegramOutboxTestCase(TestCase):
+    def deliver(self, server: FakeTelegramServer) -> int:
+        with override_settings(TELEGRAM_API_URL=server.url):
+            return deliver_pending_messages()
+
+    def test_pending_messages_are_combined(self):
+        enqueue_telegram_message("first")
+        enqueue_telegram_message("second")
+        with FakeTelegramServer() as server:
+            self.assertEqual(self.deliver(server), 2)
+        self.assertEqual(server.messages, ["first\n\nsecond"])
+        self.assertEqual(
+            TelegramMessage.objects.filter(status=TelegramMessage.SENT).count(), 2
+        )
+
+    @override_settings(TELEGRAM_MESSAGE_LIMIT=10)
+    def test_messages_split_by_size_limit(self):
+        enqueue_telegram_message("first")
+        enqueue_telegram_message("second")
+        with FakeTelegramServer() as server:
+            self.assertEqual(self.deliver(server), 2)
+        self.assertEqual(server.messages, ["first", "second"])
+
+    def test_rate_limited_messages_are_postponed(self):
+        message = enqueue_telegram_message("rate limited")
+        with FakeTelegramServer() as server:
+            server.responses.append(
+                (
+                    429,
+                    {
+                        "ok": False,
+                        "error_code": 429,
+                        "parameters": {"retry_after": 30},
+                    },
+                )
+            )
+            self.assertEqual(self.deliver(server), 0)
+            # Nothing is due until retry_after passes
+            self.assertEqual(self.deliver(server), 0)
+        message.refresh_from_db()
+        self.assertEqual(message.status, TelegramMessage.PENDING)
+        self.assertEqual(message.attempts, 0)
+        self.assertGreater(message.next_attempt_at, timezone.now())
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        message = enqueue_telegram_message("flaky")
+        with FakeTelegramServer() as server:
+            server.responses.append((500, {"ok": False, "description": "Oops"}))
+            self.assertEqual(self.deliver(server), 0)
+            message.refresh_from_db()
+            self.assertEqual(message.attempts, 1)
+            self.assertEqual(message.last_error, "Oops")
+            self.assertGreater(message.next_attempt_at, timezone.now())
+
+            TelegramMessage.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(self.deliver(server), 1)
+        self.assertEqual(server.messages, ["flaky"])
+
+    @override_settings(TELEGRAM_MAX_ATTEMPTS=1)
+    def test_message_fails_after_max_attempts(self):
+        message = enqueue_telegram_message("broken")
+        with FakeTelegramServer() as server:
+            server.responses.append((400, {"ok": False, "description": "Bad"}))
+            self.deliver(server)
+        message.refresh_from_db()
+        self.assertEqual(message.status, TelegramMessage.FAILED)
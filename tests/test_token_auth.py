@@ -0,0 +1,136 @@
+from datetime import date, timedelta
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from book.models import Book, Borrowing
+from customer.authentication import ClaimsUser, user_cache
+from customer.models import User
+
+
+class TokenAuthTest(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(
+            email="test_user@example.com", password="password"
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover="Soft",
+            inventory=1,
+            daily_fee=1,
+        )
+        self.client = APIClient()
+
+    def authenticate(self, email: str = "test_user@example.com") -> None:
+        response = self.client.post(
+            reverse("customer:token_obtain_pair"),
+            {"email": email, "password": "password"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def test_list_without_user_query(self):
+        self.authenticate()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("book:borrowing-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(
+            [query for query in queries if "customer_user" in query["sql"]]
+        )
+
+    def test_staff_claims(self):
+        User.objects.create_user(
+            email="admin@example.com", password="password", is_staff=True
+        )
+        book = {
+            "title": "New Book",
+            "author": "Test Author",
+            "cover": "Hard",
+            "inventory": 1,
+            "daily_fee": "1.00",
+        }
+        self.authenticate("admin@example.com")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("book:book-list"), book)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(
+            [query for query in queries if "customer_user" in query["sql"]]
+        )
+
+        self.authenticate()
+        response = self.client.post(reverse("book:book-list"), book)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_create_borrowing(self):
+        self.authenticate()
+        response = self.client.post(
+            reverse("book:borrowing-list"),
+            {
+                "book": self.book.id,
+                "borrow_date": date.today(),
+                "expected_return_date": date.today() + timedelta(days=7),
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Borrowing.objects.get().user, self.user)
+
+    def obtain_token_pair(self) -> dict:
+        return self.client.post(
+            reverse("customer:token_obtain_pair"),
+            {"email": "test_user@example.com", "password": "password"},
+        ).data
+
+    def refresh(self, refresh: str):
+        return self.client.post(reverse("customer:token_refresh"), {"refresh": refresh})
+
+    def test_refresh_uses_current_claims(self):
+        tokens = self.obtain_token_pair()
+        self.assertFalse(AccessToken(tokens["access"])["is_superuser"])
+
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        response = self.refresh(tokens["refresh"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        access = AccessToken(response.data["access"])
+        self.assertTrue(access["is_staff"])
+        self.assertTrue(access["is_superuser"])
+        self.assertLessEqual(access["exp"] - access["iat"], 5 * 60)
+
+    def test_refresh_refused_for_inactive_or_deleted_user(self):
+        tokens = self.obtain_token_pair()
+        self.user.is_active = False
+        self.user.save()
+        response = self.refresh(tokens["refresh"])
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.user.delete()
+        response = self.refresh(tokens["refresh"])
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_token_without_claims_uses_cache(self):
+        token = AccessToken.for_user(self.user)
+        with self.assertNumQueries(1):
+            self.assertFalse(ClaimsUser(token).is_staff)
+            self.assertEqual(ClaimsUser(token).email, self.user.email)
+
+        self.user.is_staff = True
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.assertTrue(ClaimsUser(token).is_staff)
+
+    @override_settings(USER_CACHE_SIZE=1, USER_CACHE_TTL=0)
+    def test_cache_size_and_ttl(self):
+        other_user = User.objects.create_user(
+            email="other_user@example.com", password="password"
+        )
+        with self.assertNumQueries(3):
+            user_cache.get(self.user.id)
+            user_cache.get(self.user.id)
+            user_cache.get(other_user.id)
@@ -0,0 +1,69 @@
+from datetime import date, timedelta
+
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from book.models import Book, Borrowing, Payment
+from book.serializers import BookSerializer, BorrowingSerializer, PaymentSerializer
+from book.values_serializers import values_serializer
+from customer.models import User
+
+
+class ValuesSerializerTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test_user@example.com", password="password"
+        )
+        today = date.today()
+        for i, daily_fee in enumerate(["0.50", "12.25", "3"]):
+            book = Book.objects.create(
+                title=f"Book {i}",
+                author="Test Author",
+                cover="Hard",
+                daily_fee=daily_fee,
+            )
+            borrowing = Borrowing.objects.create(
+                book=book,
+                user=self.user,
+                borrow_date=today - timedelta(days=i),
+                expected_return_date=today + timedelta(days=7),
+                actual_return_date=today if i else None,
+            )
+            Payment.objects.create(borrowing=borrowing, money_to_pay=daily_fee)
+
+    def assert_same_output(self, serializer_class, queryset, **context):
+        expected = serializer_class(queryset, many=True, context=context).data
+        fast = values_serializer(serializer_class)
+        self.assertEqual(
+            fast.to_representation(queryset.values(*fast.lookups)),
+            [dict(row) for row in expected],
+        )
+
+    def test_books(self):
+        self.assert_same_output(BookSerializer, Book.objects.order_by("id"))
+
+    def test_borrowings(self):
+        request = RequestFactory().post("/")
+        self.assert_same_output(
+            BorrowingSerializer, Borrowing.objects.order_by("id"), request=request
+        )
+
+    def test_payments(self):
+        self.assert_same_output(PaymentSerializer, Payment.objects.order_by("id"))
+
+    def test_method_fields_rejected(self):
+        class MethodSerializer(serializers.Serializer):
+            title = serializers.SerializerMethodField()
+
+        with self.assertRaises(ValueError):
+            values_serializer(MethodSerializer)
+
+    def test_borrowing_list_hides_user_id(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        with self.assertNumQueries(1):
+            response = client.get(reverse("book:borrowing-list"))
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertNotIn("user_id", response.data["results"][0])
@@ -1,14 +1,22 @@
-from django.test import TestCase
+from unittest.mock import MagicMock, patch
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from kombu.exceptions import OperationalError
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.utils import json
 from rest_framework.test import APIClient, APITestCase
 
-from book.models import Book, Borrowing, CoverType
+from book.cache import catalog_cache_stats
+from book.models import Book, Borrowing, CoverType, Payment
 from book.serializers import (
     BookSerializer,
 )
+from book.tasks import create_payment_checkout_session
+from book.views import calculate_payment
 from customer.models import User
 
 
@@ -37,13 +45,13 @@ class BookListTestAPI(APITestCase):
     def test_get_books_unauthenticated(self):
         response = self.client.get(reverse("book:book-list"))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data["results"]), 2)
 
     def test_get_books_authenticated(self):
         self.client.force_authenticate(user=self.user)
         response = self.client.get(reverse("book:book-list"))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data["results"]), 2)
 
     def test_create_book_unauthenticated(self):
         book_data = {"title": "Test Book", "author": "Test Author"}
@@ -66,8 +74,34 @@ class BookListTestAPI(APITestCase):
     def test_filter_books_by_title(self):
         response = self.client.get(reverse("book:book-list") + "?title=Another")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]["title"], "Another Test Book")
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(response.data["results"][0]["title"], "Another Test Book")
+
+    def test_search_books_by_author(self):
+        response = self.client.get(reverse("book:book-list") + "?q=another author")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(response.data["results"][0]["author"], "Another Test Author")
+
+    def test_search_books_ranks_title_matches_first(self):
+        Book.objects.create(
+            title="Tolkien biography",
+            author="Humphrey Carpenter",
+            cover="Hard",
+            daily_fee=3.99,
+        )
+        Book.objects.create(
+            title="The Hobbit",
+            author="Tolkien",
+            cover="Hard",
+            daily_fee=4.99,
+        )
+        response = self.client.get(reverse("book:book-list") + "?q=tolkien")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [book["title"] for book in response.data["results"]],
+            ["Tolkien biography", "The Hobbit"],
+        )
 
 
 class BookDetailTestAPI(APITestCase):
@@ -108,6 +142,71 @@ class BookDetailTestAPI(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
 
+@override_settings(
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "catalog": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    }
+)
+class BookCatalogCacheTestAPI(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser",
+            email="testuser@example.com",
+            password="testpassword",
+            is_staff=True,
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover="Soft",
+            daily_fee=9.99,
+        )
+
+    def test_book_list_served_from_cache(self):
+        url = reverse("book:book-list")
+        stats = catalog_cache_stats()
+        first = self.client.get(url)
+        second = self.client.get(url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(catalog_cache_stats()["hits"], stats["hits"] + 1)
+        self.assertEqual(catalog_cache_stats()["misses"], stats["misses"] + 1)
+
+    def test_book_list_query_params_cached_separately(self):
+        self.client.get(reverse("book:book-list"))
+        response = self.client.get(reverse("book:book-list") + "?title=missing")
+        self.assertEqual(response.json()["results"], [])
+
+    def test_book_list_cached_per_host(self):
+        for number in range(10):
+            Book.objects.create(
+                title=f"Book {number}", author="Author", cover="Soft", daily_fee=1
+            )
+        url = reverse("book:book-list")
+        first = self.client.get(url, HTTP_HOST="localhost:8000")
+        second = self.client.get(url, HTTP_HOST="localhost:8001")
+        self.assertTrue(first.json()["next"].startswith("http://localhost:8000/"))
+        self.assertTrue(second.json()["next"].startswith("http://localhost:8001/"))
+
+    def test_book_update_invalidates_cache(self):
+        url = reverse("book:book-detail", kwargs={"pk": self.book.id})
+        self.assertEqual(self.client.get(url).json()["title"], "Test Book")
+        self.client.force_authenticate(user=self.user)
+        response = self.client.patch(url, {"title": "New Title"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url).json()["title"], "New Title")
+        self.assertEqual(
+            self.client.get(reverse("book:book-list")).json()["results"][0]["title"],
+            "New Title",
+        )
+
+    def test_missing_book_not_cached(self):
+        url = reverse("book:book-detail", kwargs={"pk": 9999})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+
 class BorrowingListTestsAPI(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -179,7 +278,7 @@ class BorrowingListTestsAPI(TestCase):
         response = self.client.get(self.url)
         # Check the response status code and data
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data["results"]), 2)
 
     def test_list_borrowings_superuser(self):
         # Authenticate the user
@@ -188,7 +287,7 @@ class BorrowingListTestsAPI(TestCase):
         response = self.client.get(self.url)
         # Check the response status code and data
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 3)
+        self.assertEqual(len(response.data["results"]), 3)
 
     def test_create_borrowing(self):
         self.client.force_authenticate(user=self.user1)
@@ -297,6 +396,7 @@ class BorrowingDetailTestAPI(TestCase):
         self.assertFalse(Borrowing.objects.filter(pk=self.borrowing.pk).exists())
 
 
+@patch("stripe.checkout.Session.create")
 class BorrowingReturnTestAPI(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -323,23 +423,100 @@ class BorrowingReturnTestAPI(TestCase):
         )
         self.client = APIClient()
 
-    def test_successful_return(self):
+    def mock_session(self, mock_create: MagicMock) -> None:
+        mock_session = MagicMock()
+        mock_session.id = "session_id"
+        mock_session.url = "session_url"
+        mock_create.return_value = mock_session
+
+    @override_settings(STRIPE_SECRET_KEY="sk_test_fake")
+    def test_successful_return(self, mock_create):
+        self.mock_session(mock_create)
         url = reverse("book:borrowing-return", kwargs={"pk": self.borrowing.id})
-        response = self.client.get(url)
-        print(response.data)
+        # The checkout session is created by a task once the return commits
+        with patch.object(
+            create_payment_checkout_session,
+            "delay",
+            side_effect=create_payment_checkout_session,
+        ), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.borrowing.refresh_from_db()
         self.assertIsNotNone(self.borrowing.actual_return_date)
         self.assertEqual(self.borrowing.book.inventory, 1)
+        payment = Payment.objects.get(borrowing=self.borrowing)
+        self.assertEqual(payment.session_id, "session_id")
+        self.assertEqual(payment.money_to_pay, calculate_payment(self.borrowing))
+        self.assertEqual(response.data["payment"], payment.id)
+        self.assertEqual(
+            response.data["payment_session_url"],
+            reverse("book:payment-session", kwargs={"pk": payment.id}),
+        )
+
+    def test_return_with_broker_down(self, mock_create):
+        url = reverse("book:borrowing-return", kwargs={"pk": self.borrowing.id})
+        # Callbacks run when the capture ends, inside assertLogs
+        with self.assertLogs("book.tasks", "WARNING"), patch.object(
+            create_payment_checkout_session,
+            "delay",
+            side_effect=OperationalError("Broker is unavailable"),
+        ), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(
+            Payment.objects.filter(borrowing=self.borrowing, session_id="").exists()
+        )
+
+    @override_settings(STRIPE_SECRET_KEY="sk_test_fake")
+    def test_payment_session_polling(self, mock_create):
+        self.mock_session(mock_create)
+        self.client.force_authenticate(self.user)
+        response = self.client.post(
+            reverse("book:borrowing-return", kwargs={"pk": self.borrowing.id})
+        )
+        mock_create.assert_not_called()
 
-    def test_return_with_invalid_pk(self):
+        response = self.client.get(response.data["payment_session_url"])
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertIn("Retry-After", response)
+        self.assertEqual(response.data["session_url"], "")
+
+        create_payment_checkout_session(response.data["id"])
+        # A redelivered task reuses the stored session
+        create_payment_checkout_session(response.data["id"])
+        mock_create.assert_called_once()
+
+        response = self.client.get(
+            reverse("book:payment-session", kwargs={"pk": response.data["id"]})
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["session_url"], "session_url")
+
+    def test_return_query_count(self, mock_create):
+        self.mock_session(mock_create)
+        url = reverse("book:borrowing-return", kwargs={"pk": self.borrowing.id})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(url)
+        # Savepoints of the view's transaction aside
+        statements = [
+            query["sql"]
+            for query in queries.captured_queries
+            if "SAVEPOINT" not in query["sql"]
+        ]
+        self.assertLessEqual(len(statements), 5, statements)
+        # Stripe isn't called while the borrowing is locked
+        mock_create.assert_not_called()
+
+    def test_return_with_invalid_pk(self, mock_create):
         url = reverse("book:borrowing-return", kwargs={"pk": 9999})
-        response = self.client.get(url)
+        response = self.client.post(url)
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
-    def test_return_twice(self):
+    def test_return_twice(self, mock_create):
         self.borrowing.actual_return_date = timezone.now().date()
         self.borrowing.save()
         url = reverse("book:borrowing-return", kwargs={"pk": self.borrowing.id})
-        response = self.client.get(url)
+        response = self.client.post(url)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Payment.objects.exists())
+        mock_create.assert_not_called()